@@ -1,14 +1,92 @@
 import geopandas as gpd
 import pandas as pd
-from math import cos, sin, radians, sqrt, asin
+import numpy as np
+from geodesic_utils import haversine, thin_points
+from GPSPreprocess import get_coordinates, get_points
+from ModeDetection import MODES, STOP, WALK, DRIVE
 
 
 class Extractor:
-    def __init__(self, episode_data, processed_data):
-        episode_data = self.fill_points(episode_data, processed_data)
-        self.trip_segments = self.relax_trip(
-            self.extract_trip_segments(episode_data))
-        self.activity_locations = self.extract_activity_locations(episode_data)
+    def __init__(self, episode_data, processed_data, min_dist=5):
+        # trips and stops are kept as ranges of points of processed_data, and only
+        # materialized as Geodataframes by get_trip_segments and get_activity_locations
+        self.min_dist = min_dist
+        self.processed_data = processed_data
+        self.order, self.episodes = self.find_episode_ranges(episode_data, processed_data)
+        self.trip_episodes = self.episodes[np.isin(self.episodes['mode'], [WALK, DRIVE])]
+        self.stop_episodes = self.episodes[self.episodes['mode'] == STOP]
+        self.trip_keep = self.relax_trip_ranges(self.trip_episodes)
+
+    # Returns the positions of the episodes of episode_data in order of RecordID, keeping only the
+    # last episode detected at each RecordID, as consecutive time gaps of 120s or more make
+    # ModeDetection detect episodes out of order and more than once at the same RecordID
+    def sort_episodes(self, episode_data):
+        episode_records = episode_data['RecordID'].to_numpy()
+        episode_order = np.argsort(episode_records, kind='stable')
+        sorted_records = episode_records[episode_order]
+        last = np.ones(len(episode_order), dtype=bool)
+        last[:-1] = sorted_records[1:] != sorted_records[:-1]
+        return episode_order[last]
+
+    # Finds the range of points of each episode, as the positions from start up to end in the
+    # processed points sorted by RecordID (order), episode is the position of the episode in episode_data
+    def find_episode_ranges(self, episode_data, processed_data):
+        record_ids = processed_data['RecordID'].to_numpy()
+        order = np.argsort(record_ids, kind='stable')
+        episode_order = self.sort_episodes(episode_data)
+        episodes = np.zeros(len(episode_order), dtype=[('episode', np.intp), ('start', np.intp),
+                                                       ('end', np.intp), ('mode', np.int8)])
+        episodes['episode'] = episode_order
+        episodes['start'] = np.searchsorted(record_ids[order], episode_data['RecordID'].to_numpy()[episode_order])
+        episodes['end'][:-1] = episodes['start'][1:]
+        episodes['end'][-1:] = len(order)
+        episodes['mode'] = pd.Categorical(episode_data['Modes'], categories=MODES).codes[episode_order]
+        return order, episodes
+
+    # Returns the positions in processed_data of all points of the episodes, in order
+    def get_point_positions(self, episodes):
+        lengths = episodes['end'] - episodes['start']
+        offsets = np.repeat(episodes['start'] - (np.cumsum(lengths) - lengths), lengths)
+        return self.order[np.arange(lengths.sum()) + offsets]
+
+    # Returns a mask of the points of the trip episodes that are kept by relax_trip, a trip
+    # starts at a trip episode that does not follow right after the previous trip episode
+    def relax_trip_ranges(self, trip_episodes):
+        lengths = trip_episodes['end'] - trip_episodes['start']
+        new_trip = np.ones(len(trip_episodes), dtype=bool)
+        new_trip[1:] = trip_episodes['start'][1:] != trip_episodes['end'][:-1]
+        trip_starts = np.zeros(lengths.sum(), dtype=bool)
+        trip_starts[(np.cumsum(lengths) - lengths)[new_trip & (lengths > 0)]] = True
+
+        target = self.processed_data.iloc[self.get_point_positions(trip_episodes)]
+        return self.find_relaxed_points(target['SerialID'].to_numpy(), *get_coordinates(target), trip_starts)
+
+    # Materializes the points of the episodes as a Geodataframe with the mode of the episode
+    # of each point, only keeping the points where keep is True if given
+    def get_episode_points(self, episodes, keep=None):
+        positions = self.get_point_positions(episodes)
+        modes = MODES[np.repeat(episodes['mode'], episodes['end'] - episodes['start'])]
+        if keep is not None:
+            positions = positions[keep]
+            modes = modes[keep]
+        target = self.processed_data.iloc[positions]
+        data = {'SerialID': target['SerialID'].tolist(),
+                'RecordID': target['RecordID'].tolist(),
+                'TimeStart': target['LocalTime'].tolist(),
+                'Modes': modes.tolist(),
+                'geometry': get_points(target)}
+        return gpd.GeoDataFrame(data)
+
+    # Getters for the episodes, trips and stops as a numpy structured array of
+    # (episode, start, end, mode) ranges over the processed points sorted by RecordID
+    def get_episode_ranges(self):
+        return self.episodes
+
+    def get_trip_ranges(self):
+        return self.trip_episodes
+
+    def get_stop_ranges(self):
+        return self.stop_episodes
 
     # Extracts data with modes that are either "Walk" or "Drive"
     def extract_trip_segments(self, episode_data):
@@ -17,94 +95,48 @@ class Extractor:
         return data.reset_index(drop=True)
 
     def distance(self, p1, p2):
-
-        # convert from degrees to radian
-        lon1 = radians(p1.x)
-        lon2 = radians(p2.x)
-        lat1 = radians(p1.y)
-        lat2 = radians(p2.y)
-
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-
-        c = 2 * asin(sqrt(a))
-
-        # radius of earth in meters
-        r = 6378137
-
-        return c * r
+        return float(haversine(p1.x, p1.y, p2.x, p2.y))
 
     # add points between each detected mode with points from processed data
     def fill_points(self, episode_data, processed_data):
-        length = len(episode_data.index) - 1
-        add = gpd.GeoDataFrame()
-        for index, row in episode_data.iterrows():
-            mode = row["Modes"]
-            record_id = row["RecordID"]
-            serial_ids = []
-            record_ids = []
-            start_times = []
-            modes = []
-            geometry = []
-            # fill points until next mode
-            if (index != length):
-                next_record_id = episode_data[index +
-                                              1:index + 2]['RecordID'].iloc[0]
-                filtered_data = processed_data.loc[(processed_data['RecordID'] > record_id) & (
-                    processed_data['RecordID'] < next_record_id)]
-                for index, row in filtered_data.iterrows():
-                    serial_ids.append(row["SerialID"])
-                    record_ids.append(row['RecordID'])
-                    start_times.append(row["LocalTime"])
-                    modes.append(mode)
-                    geometry.append(row['geometry'])
-                data = {'SerialID': serial_ids,
-                        'RecordID': record_ids,
-                        'TimeStart': start_times,
-                        'Modes': modes,
-                        'geometry': geometry}
-                add = pd.concat([add, gpd.GeoDataFrame(data)],
-                                ignore_index=True)
-            # fill points until end
-            else:
-                filtered_data = processed_data.loc[processed_data['RecordID'] > record_id]
-                for index, row in filtered_data.iterrows():
-                    serial_ids.append(row["SerialID"])
-                    record_ids.append(row['RecordID'])
-                    start_times.append(row["LocalTime"])
-                    modes.append(mode)
-                    geometry.append(row['geometry'])
-                data = {'SerialID': serial_ids,
-                        'RecordID': record_ids,
-                        'TimeStart': start_times,
-                        'Modes': modes,
-                        'geometry': geometry}
-                episode_data = pd.concat(
-                    [episode_data, add, gpd.GeoDataFrame(data)]).sort_values(by=['RecordID'])
+        if episode_data.empty:
+            return episode_data.reset_index(drop=True)
+        episode_data = episode_data.iloc[self.sort_episodes(episode_data)]
+        episode_records = episode_data['RecordID'].to_numpy()
+        record_ids = processed_data['RecordID'].to_numpy()
+        # the episode each point falls in is the last episode starting at or before it
+        episode_index = np.searchsorted(episode_records, record_ids, side='right') - 1
+        # points before the first episode are not filled and the episode start points are
+        # already in episode_data
+        filled = episode_index >= 0
+        filled[filled] = record_ids[filled] != episode_records[episode_index[filled]]
+        data = {'SerialID': processed_data['SerialID'].to_numpy()[filled],
+                'RecordID': record_ids[filled],
+                'TimeStart': processed_data['LocalTime'].to_numpy()[filled],
+                'Modes': episode_data['Modes'].to_numpy()[episode_index[filled]],
+                'geometry': get_points(processed_data)[filled]}
+        episode_data = pd.concat([episode_data, gpd.GeoDataFrame(data)]).sort_values(
+            by=['RecordID'], kind='stable')
 
         return episode_data.reset_index(drop=True)
 
-    # Processes trip segments to filter out points with distances <5m
-    def relax_trip(self, data):
-        start = 0
-        dropped = []
-        min_dist = 5
-        for index, row in data.iterrows():
-            point = row["geometry"]
-            if (not start):
-                start = point
-                continue
-            if (self.distance(start, point) < min_dist):
-                dropped.append(index)
-            else:
-                start = point
-        data = data.drop(dropped)
+    # Processes trip segments to filter out points closer than min_dist to the last kept point,
+    # which is reset at the first point of each trip (trip_starts) and of each SerialID
+    def relax_trip(self, data, trip_starts=None):
+        keep = self.find_relaxed_points(data["SerialID"].to_numpy(), *get_coordinates(data), trip_starts)
+        data = data[keep]
         return data.reset_index(drop=True)
 
+    # Returns a mask of the trip points kept by relax_trip
+    def find_relaxed_points(self, serial_ids, lon, lat, trip_starts=None):
+        starts = np.ones(len(serial_ids), dtype=bool)
+        starts[1:] = serial_ids[1:] != serial_ids[:-1]
+        if trip_starts is not None:
+            starts |= trip_starts
+        return thin_points(lon, lat, self.min_dist, starts)
+
     def get_trip_segments(self):
-        return self.trip_segments
+        return self.get_episode_points(self.trip_episodes, self.trip_keep)
 
     # Extracts data with modes that is "Stop"
     def extract_activity_locations(self, episode_data):
@@ -112,4 +144,4 @@ class Extractor:
         return data.reset_index(drop=True)
 
     def get_activity_locations(self):
-        return self.activity_locations
+        return self.get_episode_points(self.stop_episodes)
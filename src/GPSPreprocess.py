@@ -4,35 +4,371 @@ Source Name: GPSPreprocess.py
 Creator: Zabrain Ali (aliz8@mcmaster.ca)
 Requirements: Python 3.8 or later
 Date Created: Feb 12, 2023
-Last Revised: Mar 18, 2023
+Last Revised: Oct 18, 2026
 Description: Preprocess raw GPS data to remove redundant and outliers GPS points
 
 Version History:
 2023-02-12 (GPSPreprocess.py) Create skeleton of class GPSPreprocess
 2023-02-15 (GPSPreprocess.py) Create get_data, filter_data and smooth_data
+2026-10-18 (GPSPreprocess.py) Add normalize_time to parse 'LocalTime' once into a 'Timestamp' column
+2026-10-18 (GPSPreprocess.py) Add load_csv to read and preprocess a GPS data csv file in typed chunks
+2026-10-18 (GPSPreprocess.py) Add load_gpx to stream the points of a GPX file through the same chunks
+2026-10-18 (GPSPreprocess.py) Add a Feather cache of the processed data to load_csv and load_gpx
+2026-10-18 (GPSPreprocess.py) Add lazy_geometry to keep the points as 'longitude' and 'latitude' columns only, and
+    get_coordinates, get_points and add_geometry functions
+2026-10-18 (GPSPreprocess.py) Add per_device to remove only consecutive duplicates of each SerialID
+2026-10-18 (GPSPreprocess.py) Add filters to run the filter stages of gps_filters as one mask, and preprocess to
+    copy the rows kept only once
+2026-10-18 (GPSPreprocess.py) Put the last points of each chunk of load_chunks before the next chunk, so the filter
+    stages comparing neighbouring points give the same result for any chunksize
+2026-10-18 (GPSPreprocess.py) Read with the pandas 'c' engine by default in load_csv, pyarrow only if asked for
+2026-10-18 (GPSPreprocess.py) Raise InvalidDataException from load_csv for values that cannot be read as the type
+    of their column
+2026-10-18 (GPSPreprocess.py) Set the combined categories on copies of the chunks in concat_chunks
 """
 import geopandas as gpd
 import pandas as pd
+import numpy as np
 import os
+import hashlib
+import xml.etree.ElementTree as ET
+from geodesic_utils import consecutive_distances
+from gps_filters import PointArrays, SpeedCap
+from Exceptions import InvalidDataException
+
+try:
+    import pyarrow
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather
+except ImportError:
+    pa_csv = None
+
+# Format of the 'LocalTime' column in the raw GPS data
+TIME_FORMAT = '%m/%d/%Y %H:%M'
+# Columns of the raw GPS data and the types they are read as
+GPS_COLUMNS = {'RecordID': 'int64',
+               'SerialID': 'int64',
+               'LocalTime': 'category',
+               'latitude': 'float64',
+               'longitude': 'float64',
+               'Fix_Status': 'category',
+               'DOP': 'float32',
+               'Speed_kmh': 'float64',
+               'Limit_kmh': 'float32'}
+# Number of rows of the raw GPS data read and preprocessed at a time by load_csv
+CHUNK_SIZE = 1000000
+# Version of the preprocessing, part of the key of the cached processed data so changes to it invalidate the cache
+CACHE_VERSION = 3
+
+
+# Return the longitudes and latitudes of the points of a DataFrame as numpy arrays, from its 'longitude' and
+# 'latitude' columns if it has them or else from its 'geometry' column
+def get_coordinates(data):
+    if 'longitude' in data and 'latitude' in data:
+        return data['longitude'].to_numpy(dtype=float), data['latitude'].to_numpy(dtype=float)
+    return data.geometry.x.to_numpy(), data.geometry.y.to_numpy()
+
+
+# Return the points of a DataFrame as a geometry array, from its 'geometry' column if it has one or else built from
+# its 'longitude' and 'latitude' columns
+def get_points(data):
+    if 'geometry' in data:
+        return data['geometry'].values
+    return gpd.points_from_xy(data['longitude'], data['latitude'])
+
+
+# Return a DataFrame of processed data as a GeoDataFrame, adding the 'geometry' column if it does not have one
+def add_geometry(data):
+    if isinstance(data, gpd.GeoDataFrame) and 'geometry' in data:
+        return data
+    return gpd.GeoDataFrame(data, geometry=get_points(data))
+
 
 class GPSPreprocess:
-    def __init__(self, data=None):
+    def __init__(self, data=None, time_format=TIME_FORMAT, lazy_geometry=False, per_device=False, filters=None):
+        # with lazy_geometry the processed data is a DataFrame without the 'geometry' column, the points are only kept
+        # as the 'longitude' and 'latitude' columns and built by add_geometry when they are needed.
+        # with per_device the data is sorted by 'SerialID' and 'RecordID' and only a point at the same latitude and
+        # longitude as the previous point of the same device is removed, instead of every point seen before.
+        # filters is the list of filter stages of gps_filters, each with a get_mask method returning the points it
+        # keeps, and defaults to removing points with 'Speed_kmh' over 180
         data = data
-        filtered_data = self.filter_data(data)
-        smoothed_data = self.smooth_data(filtered_data)
-        self.processed_data = smoothed_data
+        self.time_format = time_format
+        self.lazy_geometry = lazy_geometry
+        self.per_device = per_device
+        self.filters = [SpeedCap(180.0)] if filters is None else list(filters)
+        self.processed_data = self.preprocess(data)
 
 # Return GeoDataFrame of processed data
     def get_data(self):
         return self.processed_data
 
-# Remove all duplicate rows with the same latitudes and longitudes and converts DataFrame to GeoDataFrame
+# Read and preprocess a GPS data csv file 'chunksize' rows at a time with the types of GPS_COLUMNS, so only one
+# chunk of the raw data is in memory at once, and return the GeoDataFrame of processed data. 'engine' is the
+# engine of pd.read_csv, or 'pyarrow' to read faster with pyarrow if it is installed, which can parse a few
+# coordinates differently in the last digit and so keep points the pandas parser finds to be duplicates.
+# If 'cache_dir' is given, the processed data is cached there (see load_cached)
+    def load_csv(self, file_path, chunksize=CHUNK_SIZE, engine='c', cache_dir=None):
+        header = pd.read_csv(file_path, nrows=0).columns
+        if not pd.Index(GPS_COLUMNS).isin(header).all():
+            raise InvalidDataException()
+        return self.load_cached(file_path, cache_dir, ('csv', engine),
+                                lambda: self.load_chunks(self.read_csv_chunks(file_path, chunksize, engine)))
+
+# Read and preprocess the waypoints and track points of a GPX file 'chunksize' points at a time, and return the
+# GeoDataFrame of processed data. The columns of GPS_COLUMNS are read from the extensions of each point if present,
+# otherwise 'LocalTime' is taken from the <time> of the point, 'RecordID' is the number of the point in the file,
+# 'SerialID' is serial_id and 'Speed_kmh' is derived from the distance and time from the previous point.
+# If 'cache_dir' is given, the processed data is cached there (see load_cached)
+    def load_gpx(self, file_path, chunksize=CHUNK_SIZE, serial_id=0, cache_dir=None):
+        return self.load_cached(file_path, cache_dir, ('gpx', serial_id),
+                                lambda: self.load_chunks(self.read_gpx_chunks(file_path, chunksize, serial_id)))
+
+# Return the processed data of a file from a Feather file in 'cache_dir' named by the hash of the content of the file
+# and the parameters of preprocessing, memory-mapping it, or else process it with 'load' and write it there. The
+# 'geometry' column is not stored but built from the longitudes and latitudes as in filter_data unless lazy_geometry
+# is set, which is faster than decoding stored geometries. Without 'cache_dir' or pyarrow, the file is always processed with 'load'
+    def load_cached(self, file_path, cache_dir, params, load):
+        if cache_dir is None or pa_csv is None:
+            return load()
+
+        key = hashlib.sha256(repr((CACHE_VERSION, GPS_COLUMNS, self.time_format, self.per_device, self.filters,
+                                      params)).encode())
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                key.update(block)
+        cache_path = os.path.join(cache_dir, key.hexdigest() + '.feather')
+        if os.path.isfile(cache_path):
+            data = pyarrow.feather.read_table(cache_path, memory_map=True).to_pandas()
+            if not self.lazy_geometry:
+                # the 'geometry' column comes before the 'Timestamp' column added by normalize_time
+                data.insert(len(data.columns) - 1, 'geometry', gpd.points_from_xy(data.longitude, data.latitude))
+                data = gpd.GeoDataFrame(data)
+            self.processed_data = data
+            return self.processed_data
+
+        data = load()
+        os.makedirs(cache_dir, exist_ok=True)
+        # written uncompressed so it can be memory-mapped, and renamed once complete so a partly written file is
+        # never read
+        temp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        pyarrow.feather.write_feather(pd.DataFrame(data).drop(columns='geometry', errors='ignore'), temp_path, compression='uncompressed')
+        os.replace(temp_path, cache_path)
+        return data
+
+# Preprocess DataFrames of raw GPS data one at a time and return the GeoDataFrame of processed data of all of them.
+# Filter stages compare each point with the points before and after it, so the last two points kept by filter_data
+# of each chunk are put before the next chunk, and the last point is only kept or removed once the next chunk is read
+    def load_chunks(self, raw_chunks):
+        if self.per_device:
+            # the points of a device can be in any chunk, so they are sorted and filtered once all chunks are read
+            raw_chunks = [self.concat_chunks(list(raw_chunks))]
+
+        # coordinates of every point kept so far, so duplicates in later chunks are removed as well
+        seen = np.zeros(0, dtype=complex)
+        # the last points of the previous chunk, of which all but the last are already kept or removed
+        context = None
+        chunks = []
+        for data in raw_chunks:
+            if not self.per_device:
+                coords = data['latitude'].to_numpy() + 1j * data['longitude'].to_numpy()
+                if len(seen):
+                    data = data[seen[np.searchsorted(seen, coords).clip(max=len(seen) - 1)] != coords]
+                    coords = data['latitude'].to_numpy() + 1j * data['longitude'].to_numpy()
+                # both are sorted, so the stable sort only merges them
+                seen = np.concatenate([seen, np.unique(coords)])
+                seen.sort(kind='stable')
+            if context is not None:
+                data = self.concat_chunks([context, data])
+            positions = self.find_unique_rows(data)
+            skip = 0 if context is None else len(context) - 1
+            chunks.append(self.preprocess(data, positions, skip=skip, hold_back=True))
+            if len(positions):
+                context = data.take(positions[-2:]).reset_index(drop=True)
+
+        if context is not None:
+            # the last point has no point after it
+            chunks.append(self.preprocess(context, skip=len(context) - 1))
+        if not chunks:
+            chunks.append(self.preprocess(self.concat_chunks([])))
+        self.processed_data = self.concat_chunks(chunks)
+        return self.processed_data
+
+# Concatenate DataFrames of GPS data, combining the categories of each so the categorical columns stay categorical.
+# The chunks can be slices of the caller's DataFrames, so the combined categories are set on copies of them
+    def concat_chunks(self, chunks):
+        if not chunks:
+            return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in GPS_COLUMNS.items()})
+        categories = {column: pd.api.types.union_categoricals([chunk[column] for chunk in chunks]).categories
+                      for column, dtype in GPS_COLUMNS.items() if dtype == 'category'}
+        chunks = [chunk.assign(**{column: chunk[column].cat.set_categories(column_categories)
+                                  for column, column_categories in categories.items()}) for chunk in chunks]
+        return pd.concat(chunks, ignore_index=True)
+
+# Yield DataFrames of the GPS_COLUMNS of a csv file with at most about 'chunksize' rows, raising InvalidDataException
+# if a value cannot be read as the type of its column, e.g. a missing SerialID or a latitude that is not a number
+    def read_csv_chunks(self, file_path, chunksize, engine):
+        if engine == 'pyarrow' and pa_csv is None:
+            raise ImportError("engine='pyarrow' requires pyarrow to be installed")
+        try:
+            if engine != 'pyarrow':
+                yield from pd.read_csv(file_path, usecols=list(GPS_COLUMNS), dtype=GPS_COLUMNS,
+                                       chunksize=chunksize, engine=engine)
+            else:
+                yield from self.read_csv_batches(file_path, chunksize)
+        except ValueError as error:
+            # pyarrow's ArrowInvalid is a ValueError as well
+            raise InvalidDataException('Data has invalid values: %s' % error) from error
+
+# Yield DataFrames of the GPS_COLUMNS of a csv file read by pyarrow with at most about 'chunksize' rows
+    def read_csv_batches(self, file_path, chunksize):
+        # pyarrow reads blocks of bytes, rows of the GPS data are about 64 bytes long. Categorical columns are read
+        # as dictionary encoded strings, which become categorical columns in pandas without comparing strings
+        column_types = {column: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()) if dtype == 'category'
+                        else pyarrow.from_numpy_dtype(np.dtype(dtype)) for column, dtype in GPS_COLUMNS.items()}
+        reader = pa_csv.open_csv(
+            file_path, read_options=pa_csv.ReadOptions(block_size=chunksize * 64),
+            convert_options=pa_csv.ConvertOptions(include_columns=list(GPS_COLUMNS), column_types=column_types))
+        for batch in reader:
+            yield batch.to_pandas()
+
+# Yield DataFrames of the GPS_COLUMNS of the points of a GPX file with at most 'chunksize' rows, parsing the file
+# incrementally and removing each point from the parsed tree once it is read, so memory does not grow with the file
+    def read_gpx_chunks(self, file_path, chunksize, serial_id):
+        point_fields = []
+        parents = []
+        record_id = 0
+        # latitude, longitude and time of the last point of the previous chunk
+        last_point = None
+        for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if elem.tag.rsplit('}', 1)[-1] not in ('wpt', 'trkpt'):
+                continue
+            # fields of the point by tag without namespace, e.g. <ogr:Speed_kmh> or <time>
+            fields = {child.tag.rsplit('}', 1)[-1]: child.text for child in elem.iter()}
+            fields['latitude'] = elem.get('lat')
+            fields['longitude'] = elem.get('lon')
+            fields.setdefault('RecordID', record_id)
+            fields.setdefault('SerialID', serial_id)
+            record_id += 1
+            point_fields.append(fields)
+            if parents:
+                parents[-1].remove(elem)
+
+            if len(point_fields) == chunksize:
+                data, last_point = self.get_gpx_data(point_fields, last_point)
+                point_fields = []
+                yield data
+        if point_fields:
+            yield self.get_gpx_data(point_fields, last_point)[0]
+
+# Return a DataFrame of the GPS_COLUMNS of the fields of GPX points, and the latitude, longitude and time of the
+# last point, where the speed of the first point is derived from last_point of the previous points
+    def get_gpx_data(self, point_fields, last_point):
+        fields = pd.DataFrame(point_fields)
+        data = pd.DataFrame(index=fields.index)
+        for column, dtype in GPS_COLUMNS.items():
+            values = fields[column] if column in fields else pd.Series(np.nan, index=fields.index)
+            data[column] = values.astype(dtype) if dtype == 'category' else pd.to_numeric(values).astype(dtype)
+
+        times = pd.to_datetime(fields['time'], utc=True).dt.tz_localize(None) if 'time' in fields \
+            else pd.Series(pd.NaT, index=fields.index)
+        if data['LocalTime'].isna().any():
+            local_times = times.dt.strftime(self.time_format)
+            data['LocalTime'] = data['LocalTime'].astype(object).fillna(local_times).astype('category')
+
+        # <speed> of GPX 1.0 points is in m/s
+        if 'speed' in fields:
+            data['Speed_kmh'] = data['Speed_kmh'].fillna(pd.to_numeric(fields['speed']) * 3.6)
+
+        lat = data['latitude'].to_numpy()
+        lon = data['longitude'].to_numpy()
+        times = times.to_numpy()
+        if last_point is not None:
+            lat = np.append(last_point[0], lat)
+            lon = np.append(last_point[1], lon)
+            times = np.append(last_point[2], times)
+        # speed from the previous point in km/h, 0 for the first point and points at the same time
+        seconds = np.diff(times) / np.timedelta64(1, 's')
+        speeds = np.zeros(len(seconds))
+        np.divide(consecutive_distances(lon, lat) * 3.6, seconds, out=speeds, where=seconds > 0)
+        speeds[np.isnan(seconds)] = np.nan
+        if last_point is None:
+            speeds = np.append(0.0, speeds)
+        data['Speed_kmh'] = data['Speed_kmh'].fillna(pd.Series(speeds, index=data.index))
+
+        return data, (lat[-1], lon[-1], times[-1])
+
+# Filter and smooth raw GPS data in one pass: find the rows kept by filter_data, run every filter stage on the arrays
+# of those rows and combine their masks, then copy the rows kept by all of them only once. Returns the processed data
+# with the 'geometry' column, unless lazy_geometry is set, and the 'Timestamp' column of normalize_time. 'positions'
+# are the rows kept by filter_data if already found. The first 'skip' of those rows are only used by the filter stages
+# as the points before the others, and with 'hold_back' the last of them is only used as the point after the others
+    def preprocess(self, data, positions=None, skip=0, hold_back=False):
+        if data is None:
+            return None
+        else:
+            if positions is None:
+                positions = self.find_unique_rows(data)
+            points = PointArrays(data, positions, self.time_format)
+            keep = self.get_filter_mask(points)
+            keep[:skip] = False
+            if hold_back and len(keep):
+                keep[-1] = False
+
+            processed_data = data.take(positions[keep])
+            processed_data.reset_index(drop=True, inplace=True)
+            if not self.lazy_geometry:
+                processed_data = gpd.GeoDataFrame(processed_data, geometry=gpd.points_from_xy(
+                    processed_data.longitude, processed_data.latitude))
+            # the times are already parsed if a filter stage used them
+            processed_data['Timestamp'] = points['Timestamp'][keep].view('datetime64[ns]')
+            return processed_data
+
+# Return the positions of the rows of raw GPS data kept by filter_data, in the order they are kept
+    def find_unique_rows(self, data):
+        if not self.per_device:
+            # Keeps the first row of all rows in DataFrame with duplicate latitudes and longitudes
+            return np.flatnonzero(~data.duplicated(subset=['latitude', 'longitude'], keep='first').to_numpy())
+
+        # Sort rows by 'SerialID' and 'RecordID' and remove each row with the same latitude and longitude as the row
+        # before it of the same device, comparing each row with the previous row at once without hashing the
+        # coordinates
+        serial_ids = data['SerialID'].to_numpy()
+        record_ids = data['RecordID'].to_numpy()
+        order = np.arange(len(serial_ids))
+        in_order = (serial_ids[1:] > serial_ids[:-1]) | ((serial_ids[1:] == serial_ids[:-1])
+                                                         & (record_ids[1:] >= record_ids[:-1]))
+        if not in_order.all():
+            order = np.lexsort((record_ids, serial_ids))
+            serial_ids = serial_ids[order]
+
+        latitudes = data['latitude'].to_numpy()[order]
+        longitudes = data['longitude'].to_numpy()[order]
+        duplicate = np.zeros(len(serial_ids), dtype=bool)
+        duplicate[1:] = ((serial_ids[1:] == serial_ids[:-1]) & (latitudes[1:] == latitudes[:-1])
+                         & (longitudes[1:] == longitudes[:-1]))
+        return order[~duplicate]
+
+# Return a boolean numpy array of the points kept by all filter stages, from the PointArrays of the points
+    def get_filter_mask(self, points):
+        keep = np.ones(points.num_points, dtype=bool)
+        for stage in self.filters:
+            keep &= stage.get_mask(points)
+        return keep
+
+# Remove all duplicate rows with the same latitudes and longitudes and converts DataFrame to GeoDataFrame,
+# unless lazy_geometry is set. With per_device only consecutive duplicates of each device are removed
     def filter_data(self, data):
         if data is None:
             return None
         else:
-            # Removes all rows in DataFrame with duplicate latitudes and longitudes
-            data = data.drop_duplicates(subset=['latitude', 'longitude'], keep='first')
+            data = data.iloc[self.find_unique_rows(data)]
+            if self.lazy_geometry:
+                return data.reset_index(drop=True)
 
             # Converts DataFrame to GeoDataFrame and adds 'geometry' column which will be points based on the
             # latitude and longitude from the DataFrame
@@ -43,15 +379,24 @@ class GPSPreprocess:
 
             return filtered_data
 
-# Remove all rows where 'Speed_kmh' > 180.0
+# Remove all rows not kept by the filter stages, by default all rows where 'Speed_kmh' > 180.0
     def smooth_data(self, data):
         if data is None:
             return None
         else:
-            # Remove all rows that have a value of greater than 180.0 for the column 'Speed_kmh'
-            smoothed_data = data.drop(data[data.Speed_kmh > 180.0].index)
+            # Remove all rows removed by any filter stage at once
+            smoothed_data = data[self.get_filter_mask(PointArrays(data, None, self.time_format))]
 
             # Reset index of GeoDataFrame
             smoothed_data.reset_index(drop=True, inplace=True)
             return smoothed_data
 
+# Parse 'LocalTime' of every row at once into a datetime64 'Timestamp' column
+    def normalize_time(self, data):
+        if data is None:
+            return None
+        else:
+            # 'LocalTime' is kept as is since it is used as the start time of the detected episodes
+            # a categorical 'LocalTime' is parsed once per category
+            data['Timestamp'] = pd.to_datetime(data['LocalTime'], format=self.time_format).astype('datetime64[ns]')
+            return data
@@ -1,13 +1,42 @@
 import geopandas as gpd
-from math import cos, sin, radians, sqrt, asin, floor
-import re
-import datetime
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from GPSPreprocess import TIME_FORMAT, get_coordinates, get_points, add_geometry
+from geodesic_utils import haversine, consecutive_distances
+from Exceptions import InvalidInputException
+
+# Codes of the modes in the episode table returned by segment_episodes
+STOP, WALK, DRIVE = 0, 1, 2
+MODES = np.array(['Stop', 'Walk', 'Drive'], dtype=object)
+# Minimum length in seconds of a valid episode of each mode
+MIN_EPISODE_LEN = np.array([120, 60, 120])
 
 
 class ModeDetection:
-    def __init__(self, processed_data=None):
-        if not processed_data.empty:
-            self.episode_data = self.detect_modes(processed_data)
+    def __init__(self, processed_data=None, time_format=TIME_FORMAT, engine='array',
+                 by_serial=False, processes=None):
+        """
+        Parameters:
+        processed_data: A Geodataframe that contains the filtered and smoothed data of GPS points
+        time_format: Format of the 'LocalTime' column, used if processed_data has no 'Timestamp' column
+        engine: 'array' to detect episodes over runs of points with segment_episodes,
+                'loop' to detect episodes point by point
+        by_serial: If True, detect episodes of the points of each SerialID separately
+        processes: Number of processes used to detect episodes of different SerialIDs in parallel,
+                   defaults to the number of CPUs
+        """
+        if engine not in ('array', 'loop'):
+            raise InvalidInputException("engine must be either 'array' or 'loop'")
+        self.time_format = time_format
+        self.engine = engine
+        self.processes = processes
+        if processed_data is not None and not processed_data.empty:
+            if by_serial:
+                self.episode_data = self.detect_modes_by_serial(processed_data)
+            else:
+                self.episode_data = self.detect_modes(processed_data)
 
     def distance(self, p1, p2):
         """
@@ -17,95 +46,133 @@ class ModeDetection:
         p2: Point object with longitude, latitude
         """
 
-        # convert from degrees to radian
-        lon1 = radians(p1.x)
-        lon2 = radians(p2.x)
-        lat1 = radians(p1.y)
-        lat2 = radians(p2.y)
+        return float(haversine(p1.x, p1.y, p2.x, p2.y))
 
-        # Haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-
-        c = 2 * asin(sqrt(a))
-
-        # radius of earth in meters
-        r = 6378137
+    def get_timestamps(self, data):
+        """
+        Gets the time each point was recorded at as integer nanoseconds
+        Parameters:
+        data: A Geodataframe that contains the filtered and smoothed data of GPS points
+        """
+        # use the times parsed during preprocessing, only parse LocalTime if they are missing
+        if 'Timestamp' in data:
+            timestamps = data['Timestamp']
+        else:
+            timestamps = pd.to_datetime(data['LocalTime'], format=self.time_format)
 
-        return c * r
+        return timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
 
-    def calc_time_acc(self, data):
+    def calc_time_acc(self, data, times=None):
         """
         Gets seconds travelled at each minute segment and acceleration
         Parameters:
         data: A Geodataframe that contains the filtered and smoothed data of GPS points
+        times: Optional array of the times of the points in integer nanoseconds
         """
-        seconds = []
-        acc = []
-        zeros = []
-        marker = []
-        segment_time = 0
-        last_index = len(data.index) - 1
-        for index, row in data.iterrows():
-            curr_min = row["LocalTime"][-2:]
-            # since no time can be determined on Stops, approximation is made
-            if (index == 0):
-                start_min = curr_min
-            # if no zeros in segment, no need to do anything
-            elif (curr_min != start_min):
-                if (zeros):
-                    avg_Stop_time = (max(59.99, segment_time) -
-                                     segment_time) / len(zeros)
-                    for i in zeros:
-                        seconds[i] = avg_Stop_time
-                        next_speed = data[i + 1:i +
-                                          2]['Speed_kmh'].iloc[0] * 5 / 18
-                        if (avg_Stop_time != 0):
-                            acc[i] = next_speed / avg_Stop_time
-
-                start_min = curr_min
-                segment_time = 0
-                zeros = []
-                marker.append(index)
-
-            cur_speed = row['Speed_kmh'] * 5 / 18
-            if (cur_speed == 0):
-                seconds.append(0)
-                acc.append(0)
-                zeros.append(index)
-                continue
-            cur = row['geometry']
-            next = data[index + 1:index + 2]['geometry']
-            time = self.distance(cur, next) / (cur_speed)
-            seconds.append(time)
-            segment_time = segment_time + time
-            if (index == last_index):
-                acc.append(0)
-            else:
-                next_speed = data[index + 1:index +
-                                  2]['Speed_kmh'].iloc[0] * 5 / 18
-                acc.append(abs(cur_speed - next_speed) / time)
+        if times is None:
+            times = self.get_timestamps(data)
+        num_points = len(data.index)
+        speed = data['Speed_kmh'].to_numpy(dtype=float) * 5 / 18
+        next_speed = np.append(speed[1:], 0.0)
+        moving = speed != 0
+
+        # time taken to travel to the next point at the current speed,
+        # the last point has no next point so no time is spent there
+        dist = np.append(consecutive_distances(*get_coordinates(data)), 0.0)
+        seconds = np.zeros(num_points)
+        np.divide(dist, speed, out=seconds, where=moving)
+        acc = np.zeros(num_points)
+        has_acc = moving & (seconds != 0)
+        has_acc[-1] = False
+        np.divide(np.abs(speed - next_speed), seconds,
+                  out=acc, where=has_acc)
+
+        # split points into segments that are recorded within the same minute
+        minutes = times // (60 * 10**9)
+        markers = np.flatnonzero(minutes[1:] != minutes[:-1]) + 1
+        segments = np.zeros(num_points, dtype=np.intp)
+        segments[markers] = 1
+        segments = np.cumsum(segments)
+
+        # since no time can be determined on Stops, approximation is made
+        # by spreading the time left in each finished minute segment evenly
+        # over its Stop points, the last segment is never finished
+        segment_time = np.bincount(segments, weights=seconds)
+        num_zeros = np.bincount(segments, weights=~moving)
+        stops = np.flatnonzero(~moving & (segments < segments[-1]))
+        stop_segments = segments[stops]
+        avg_stop_time = (np.maximum(59.99, segment_time[stop_segments]) -
+                         segment_time[stop_segments]) / num_zeros[stop_segments]
+        seconds[stops] = avg_stop_time
+        acc[stops] = np.divide(next_speed[stops], avg_stop_time,
+                               out=acc[stops], where=avg_stop_time != 0)
 
         # summing consecutive seconds in each minute segment
-        sum = 0
-        mark = marker.pop(0)
-        for i in range(len(seconds)):
-            if (i == mark):
-                sum = 0
-                if (marker):
-                    mark = marker.pop(0)
-            sum += seconds[i]
-            seconds[i] = sum
+        seconds = np.concatenate([np.cumsum(segment)
+                                  for segment in np.split(seconds, markers)])
 
         return [seconds, acc]
 
+    def get_point_times(self, processed_data):
+        """
+        Gets the time each point was recorded at in integer nanoseconds, with the seconds
+        within each minute approximated from the seconds travelled
+        Parameters:
+        processed_data: A Geodataframe that contains the filtered and smoothed data of GPS points
+        """
+        # gets seconds travelled between each minute of the data
+        times = self.get_timestamps(processed_data)
+        times = times - times % (60 * 10**9)
+        [seconds, acc] = self.calc_time_acc(processed_data, times)
+
+        # add the seconds travelled to the minute each point was recorded at,
+        # inaccuracies in distance and speed can cause impossible times
+        second = np.minimum(np.floor(seconds), 59)
+        microseconds = np.minimum(np.floor((seconds - second)*10**6), 999999)
+        return (times + second.astype(np.int64) * 10**9 +
+                microseconds.astype(np.int64) * 10**3)
+
+    def segment_episodes(self, speeds, times, record_ids):
+        """
+        Returns a structured array where each row contains an episode, with the indices of
+        its first and last points, its mode code and the RecordID of its first point
+        Parameters:
+        speeds: A numpy array of the speeds of the points in km/h
+        times: A numpy array of the times of the points in integer nanoseconds
+        record_ids: A numpy array of the RecordIDs of the points
+        """
+        episodes = EpisodeSegmenter().update(speeds, times, last=True)
+
+        table = np.zeros(len(episodes), dtype=[('start', np.intp), ('end', np.intp),
+                                               ('mode', np.int8), ('record', record_ids.dtype)])
+        if episodes:
+            table['start'], table['end'], table['mode'] = zip(*episodes)
+        table['record'] = record_ids[table['start']]
+
+        return table
+
     def detect_modes(self, processed_data):
         """
         Returns a Geodataframe where each row contains a trip segment, with a labelled mode
         Parameters:
         processed_data= A Geodataframe that contains the filtered and smoothed data of GPS points
         """
+        times = self.get_point_times(processed_data)
+
+        if self.engine == 'array':
+            episodes = self.segment_episodes(processed_data['Speed_kmh'].to_numpy(dtype=float),
+                                             times, processed_data['RecordID'].to_numpy())
+            target = processed_data.iloc[episodes['start']]
+            data = {'SerialID': target['SerialID'].tolist(),
+                    'RecordID': episodes['record'].tolist(),
+                    'TimeStart': target['LocalTime'].tolist(),
+                    'Modes': MODES[episodes['mode']].tolist(),
+                    'geometry': get_points(target)}
+
+            return gpd.GeoDataFrame(data)
+
+        processed_data = add_geometry(processed_data)
+        times = times.tolist()
 
         # initialize variables for main loop
         stage_points = {}
@@ -121,9 +188,6 @@ class ModeDetection:
         last_walk_index = -1
         last = len(processed_data.index) - 1
 
-        # gets seconds travelled between each minute of the data
-        [seconds, acc] = self.calc_time_acc(processed_data)
-
         # iterate over geodataframe
         for index, row in processed_data.iterrows():
 
@@ -137,17 +201,11 @@ class ModeDetection:
                 new_mode = 'Drive'
 
             # get time difference between two points and calculate length of each stage
-            pattern = '(\d+)\/(\d+)\/(\d+)\s(\d+):(\d\d)'
-            match = re.search(pattern, row['LocalTime'])
-            # inaccuracies in distance and speed can cause impossible times
-            second = min(floor(seconds[index]), 59)
-            microseconds = min(floor((seconds[index] - second)*10**6), 999999)
-            cur_time = datetime.datetime(second=second, microsecond=microseconds, year=int(match.groups()[2]), month=int(
-                match.groups()[0]), day=int(match.groups()[1]), hour=int(match.groups()[3]), minute=int(match.groups()[4]))
+            cur_time = times[index]
             if index == 0:
                 cur_mode = new_mode
                 prev_time = cur_time
-            time_difference = (cur_time - prev_time).total_seconds()
+            time_difference = (cur_time - prev_time) / 10**9
             prev_time = cur_time
             episode_len += time_difference
             episode_lens.append(episode_len)
@@ -293,9 +351,359 @@ class ModeDetection:
 
         return gpd.GeoDataFrame(data)
 
+    def detect_modes_by_serial(self, processed_data):
+        """
+        Returns a Geodataframe where each row contains a trip segment, with a labelled mode,
+        detecting the trip segments of each SerialID separately in a pool of processes
+        Parameters:
+        processed_data= A Geodataframe that contains the filtered and smoothed data of GPS points
+        """
+        # split the points by SerialID, in the order each SerialID first appears in the data
+        serial_data = [data.reset_index(drop=True)
+                       for _, data in processed_data.groupby('SerialID', sort=False)]
+        processes = min(self.processes or os.cpu_count() or 1, len(serial_data))
+
+        if processes <= 1:
+            episode_data = [self.detect_modes(data) for data in serial_data]
+        else:
+            # map keeps the episodes of each SerialID in the same order as serial_data
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                episode_data = list(executor.map(self.detect_modes, serial_data,
+                                                 chunksize=max(1, len(serial_data) // (4 * processes))))
+
+        return pd.concat(episode_data, ignore_index=True)
+
     def get_episode_data(self):
         """
         Getter method for episode data from detect_modes
         """
 
         return self.episode_data
+
+
+class EpisodeSegmenter:
+    """
+    Detects episodes from the speeds and times of GPS points over runs of points with the same mode.
+    Only the state of the open episode is kept between calls to update, so the points of a
+    trajectory can be given all at once or in consecutive chunks with the same result.
+    """
+
+    def __init__(self):
+        # number of points given so far, the index of the first point of the next chunk
+        self.num_points = 0
+        self.last_time = None
+        # episode length at the last two points given
+        self.last_lens = [0.0, 0.0]
+        self.cur_mode = None
+        self.start_index = 0
+        self.episode_len = 0
+        self.temp_episode_len = 0
+        self.temp_stop_episode_len = 0
+        self.last_drive_index = -1
+        self.last_walk_index = -1
+        self.valid_stop = True
+        self.invalid_start = -1
+        self.num_episodes = 0
+        # the last episode found, its end can still change until the next episode is found
+        self.open_episode = None
+
+    def get_pinned_indices(self):
+        """
+        Returns a set of indices of the points given so far that can still become
+        the first point of an episode
+        """
+        pinned = {self.start_index, self.last_drive_index + 1,
+                  self.last_walk_index + 1, self.num_points - 1}
+        if self.num_episodes == 0:
+            pinned.add(self.invalid_start)
+        if self.open_episode is not None:
+            pinned.add(self.open_episode[0])
+        return {i for i in pinned if 0 <= i < self.num_points}
+
+    def update(self, speeds, times, last=False):
+        """
+        Returns a list of (start index, end index, mode code) of the episodes that are
+        finished by the given points, in order
+        Parameters:
+        speeds: A numpy array of the speeds of the next points in km/h
+        times: A numpy array of the times of the next points in integer nanoseconds
+        last: True if the given points end the trajectory, which finishes every episode
+        """
+        num_points = len(speeds)
+        base = self.num_points
+        episodes = []
+        if num_points == 0:
+            if last and self.open_episode is not None:
+                episodes.append(tuple(self.open_episode))
+                self.open_episode = None
+            return episodes
+        last_point = num_points - 1 if last else None
+
+        # determine mode based on speed thresholds
+        modes = np.full(num_points, DRIVE, dtype=np.int8)
+        modes[speeds <= 10.008] = WALK
+        modes[speeds < 0.36] = STOP
+
+        # get time difference between each point and the point before it
+        prev_time = times[0] if self.last_time is None else self.last_time
+        time_differences = np.diff(np.concatenate(([prev_time], times))) / 10**9
+        gaps = time_differences >= 120
+
+        # run-length encode the modes, a gap or the last point is always a run of its own
+        single = gaps.copy()
+        if last:
+            single[last_point] = True
+        run_starts = np.flatnonzero(np.concatenate(
+            ([True], (modes[1:] != modes[:-1]) | single[1:] | single[:-1])))
+        run_ends = np.append(run_starts[1:], num_points)
+
+        def accumulate(length, start, end):
+            # length after adding the time difference of each point from start to end in turn
+            return np.cumsum(np.concatenate(([length], time_differences[start:end])))[1:]
+
+        # length of the current episode at each point, before it is restarted by a new episode,
+        # starting with the lengths at the last two points before this chunk
+        episode_lens = np.concatenate((self.last_lens, np.zeros(num_points)))
+
+        def add_episode(start, end, mode):
+            # the previous episode can no longer change once a new episode is found
+            if self.open_episode is not None:
+                episodes.append(tuple(self.open_episode))
+            # if first episode is an invalid episode, add it to the second episode
+            if self.num_episodes == 0 and self.invalid_start >= 0:
+                start = self.invalid_start
+            self.open_episode = [start, end, mode]
+            self.num_episodes += 1
+
+        def extend_episode(end):
+            if self.num_episodes != 0:
+                self.open_episode[1] = end
+
+        if self.cur_mode is None:
+            self.cur_mode = modes[0]
+        cur_mode = self.cur_mode
+        start_index = self.start_index
+        episode_len = self.episode_len
+        temp_episode_len = self.temp_episode_len
+        temp_stop_episode_len = self.temp_stop_episode_len
+        last_drive_index = self.last_drive_index
+        last_walk_index = self.last_walk_index
+        valid_stop = self.valid_stop
+
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            new_mode = modes[start]
+            index = base + start
+
+            # if there is a gap between two points, create one or two episodes
+            # First episode: create if points before gap are a valid episode
+            # Second episode: create stop episode from gap
+            if gaps[start]:
+                episode_len += time_differences[start]
+                episode_lens[start + 2] = episode_len
+                if index >= 2 and episode_lens[start] >= MIN_EPISODE_LEN[cur_mode]:
+                    add_episode(start_index, index - 2, cur_mode)
+                else:
+                    extend_episode(index - 2)
+                add_episode(index - 1, index, STOP)
+                episode_len = 0
+                start_index = index + 1
+                cur_mode = STOP
+                continue
+
+            # if last point, create episode if valid
+            if start == last_point:
+                episode_len += time_differences[start]
+                if episode_len >= MIN_EPISODE_LEN[cur_mode]:
+                    add_episode(start_index, index, cur_mode)
+                continue
+
+            while start < end:
+                if new_mode == cur_mode:
+                    lens = accumulate(episode_len, start, end)
+                    episode_lens[start + 2:end + 2] = lens
+                    episode_len = lens[-1]
+                    # Reset variables if a temporary walking/stopping episode was detected, but it was invalid
+                    if temp_episode_len > 0:
+                        last_drive_index = -1
+                        temp_episode_len = 0
+                        valid_stop = True
+                    if temp_stop_episode_len > 0:
+                        last_walk_index = -1
+                        temp_stop_episode_len = 0
+                    start = end
+
+                # If driving and walking/stopping is detected, only switch the mode at the point where
+                # the potential walking/stopping episode becomes valid
+                elif cur_mode == DRIVE:
+                    lens = accumulate(episode_len, start, end)
+                    episode_lens[start + 2:end + 2] = lens
+                    if last_drive_index < 0:
+                        last_drive_index = base + start - 1
+                        temp_episode_len = 0
+                    if new_mode == WALK:
+                        valid_stop = False
+                    temp_lens = accumulate(temp_episode_len, start, end)
+                    valid = np.flatnonzero(temp_lens >= (60 if valid_stop else 120))
+                    if valid.size == 0:
+                        episode_len = lens[-1]
+                        temp_episode_len = temp_lens[-1]
+                        start = end
+                    else:
+                        add_episode(start_index, last_drive_index, DRIVE)
+                        start_index = last_drive_index + 1
+                        last_drive_index = -1
+                        episode_len = temp_episode_len = temp_lens[valid[0]]
+                        cur_mode = new_mode
+                        valid_stop = True
+                        start += valid[0] + 1
+
+                # If walking and stopping is detected, only switch the mode at the point where
+                # the potential stopping episode becomes valid
+                elif cur_mode == WALK and new_mode == STOP:
+                    lens = accumulate(episode_len, start, end)
+                    episode_lens[start + 2:end + 2] = lens
+                    if last_walk_index < 0:
+                        last_walk_index = base + start - 1
+                        temp_stop_episode_len = 0
+                    temp_lens = accumulate(temp_stop_episode_len, start, end)
+                    valid = np.flatnonzero(temp_lens >= 120)
+                    if valid.size == 0:
+                        episode_len = lens[-1]
+                        temp_stop_episode_len = temp_lens[-1]
+                        start = end
+                    else:
+                        add_episode(start_index, last_walk_index, WALK)
+                        start_index = last_walk_index + 1
+                        last_walk_index = -1
+                        episode_len = temp_stop_episode_len = temp_lens[valid[0]]
+                        cur_mode = new_mode
+                        start += valid[0] + 1
+
+                # If walking or stopping and a new mode detected, switch modes at the first point,
+                # and check if the current walking/stopping episode is valid
+                else:
+                    episode_len += time_differences[start]
+                    episode_lens[start + 2] = episode_len
+                    if episode_len >= MIN_EPISODE_LEN[cur_mode]:
+                        add_episode(start_index, base + start - 1, cur_mode)
+                    elif self.num_episodes == 0:
+                        self.invalid_start = start_index
+                    else:
+                        extend_episode(base + start - 1)
+                    start_index = base + start
+                    episode_len = 0
+                    cur_mode = new_mode
+                    start += 1
+
+        self.num_points = base + num_points
+        self.last_time = times[-1]
+        self.last_lens = list(episode_lens[-2:])
+        self.cur_mode = cur_mode
+        self.start_index = start_index
+        self.episode_len = episode_len
+        self.temp_episode_len = temp_episode_len
+        self.temp_stop_episode_len = temp_stop_episode_len
+        self.last_drive_index = last_drive_index
+        self.last_walk_index = last_walk_index
+        self.valid_stop = valid_stop
+
+        if last and self.open_episode is not None:
+            episodes.append(tuple(self.open_episode))
+            self.open_episode = None
+
+        return episodes
+
+
+class IncrementalModeDetection:
+    """
+    Detects modes of a trajectory whose GPS points are given in consecutive chunks, returning each
+    episode as soon as it is finished. Only the points of the last minute and the points that can
+    still start an episode are kept between chunks. The episodes returned by all calls to update and
+    close, in order, are the same as ModeDetection gives for all the points at once.
+    """
+
+    def __init__(self, time_format=TIME_FORMAT):
+        self.mode_detector = ModeDetection(time_format=time_format)
+        self.segmenter = EpisodeSegmenter()
+        # points of the last minute given, their times are not known until the next minute starts
+        self.minute_points = None
+        # points that can still start an episode, indexed by their position in the trajectory
+        self.pinned_points = None
+
+    def update(self, points):
+        """
+        Returns a Geodataframe of the episodes finished by the given points, in the same format
+        as the episode data of ModeDetection
+        Parameters:
+        points: A Geodataframe that contains the next filtered and smoothed GPS points of the trajectory
+        """
+        if self.minute_points is not None:
+            points = pd.concat([self.minute_points, points], ignore_index=True)
+        else:
+            points = points.reset_index(drop=True)
+        self.minute_points = points
+        if points.empty:
+            return self.get_episode_data(points, [])
+
+        # the seconds travelled in a minute can only be found once the next minute starts
+        minutes = self.mode_detector.get_timestamps(points) // (60 * 10**9)
+        markers = np.flatnonzero(minutes[1:] != minutes[:-1]) + 1
+        if markers.size == 0:
+            return self.get_episode_data(points.iloc[:0], [])
+        finished_points = points.iloc[:markers[-1] + 1]
+        self.minute_points = points.iloc[markers[-1]:].reset_index(drop=True)
+
+        times = self.mode_detector.get_point_times(finished_points)[:-1]
+        finished_points = finished_points.iloc[:-1]
+        episodes = self.segmenter.update(finished_points['Speed_kmh'].to_numpy(dtype=float), times)
+
+        return self.get_episode_data(finished_points, episodes)
+
+    def close(self):
+        """
+        Returns a Geodataframe of the episodes that are finished by the end of the trajectory
+        """
+        points = self.minute_points
+        self.minute_points = None
+        if points is None or points.empty:
+            # same point columns as the points kept from earlier chunks
+            lazy = self.pinned_points is None or 'geometry' not in self.pinned_points
+            points = pd.DataFrame(columns=['SerialID', 'RecordID', 'LocalTime', 'Speed_kmh']
+                                  + (['longitude', 'latitude'] if lazy else ['geometry']))
+            times = np.zeros(0, dtype=np.int64)
+        else:
+            times = self.mode_detector.get_point_times(points)
+        episodes = self.segmenter.update(points['Speed_kmh'].to_numpy(dtype=float), times, last=True)
+
+        return self.get_episode_data(points, episodes)
+
+    def get_episode_data(self, points, episodes):
+        """
+        Returns a Geodataframe where each row contains a finished episode, and keeps the points
+        that can still start an episode
+        Parameters:
+        points: A Geodataframe of the points last given to the segmenter
+        episodes: A list of (start index, end index, mode code) of the finished episodes
+        """
+        base = self.segmenter.num_points - len(points)
+        starts = [start for start, end, mode in episodes]
+        needed = sorted({i - base for i in self.segmenter.get_pinned_indices() | set(starts)
+                         if i >= base})
+        columns = ['SerialID', 'RecordID', 'LocalTime'] + (['geometry'] if 'geometry' in points
+                                                            else ['longitude', 'latitude'])
+        new_points = points.iloc[needed][columns]
+        new_points.index = [i + base for i in needed]
+        if self.pinned_points is not None:
+            new_points = pd.concat([self.pinned_points, new_points])
+
+        target = new_points.loc[starts]
+        data = {'SerialID': target['SerialID'].tolist(),
+                'RecordID': target['RecordID'].tolist(),
+                'TimeStart': target['LocalTime'].tolist(),
+                'Modes': [MODES[mode] for start, end, mode in episodes],
+                'geometry': get_points(target)}
+
+        pinned = self.segmenter.get_pinned_indices()
+        self.pinned_points = new_points[new_points.index.isin(pinned)]
+
+        return gpd.GeoDataFrame(data)
@@ -0,0 +1,371 @@
+"""
+Module Name: Gap Routing (module for routing between the ends of gaps in matched GPS points)
+Source Name: gap_routing.py
+Creator: All PyERT-BLACK project team members
+Requirements: Python 3.8 or later
+Date Created: Oct 18, 2026
+Last Revised: Oct 18, 2026
+Description: Implements the shortest path search used to fill the gaps detected between
+GPS points matched onto the transportation network, and a bounded least recently used
+cache of the shortest paths, since the same gaps are routed again and again on traces
+of repeated trips. A search can be given a budget of the length of the gap, so it stops
+early instead of exploring the whole network for nodes that are far apart or not connected.
+
+Version History:
+2026-10-18 (gap_routing.py) Create PathCache class and graph_fingerprint function
+2026-10-18 (gap_routing.py) Create GapRouter class, astar_path and bidirectional_path functions
+    to route gaps with A* or bidirectional search within a budget of the gap length
+2026-10-18 (gap_routing.py) Compute the fingerprint of a graph again when its 'weights_version' changes
+"""
+
+import hashlib
+import heapq
+import math
+import os
+import pickle
+import weakref
+from collections import OrderedDict
+from itertools import count
+
+import networkx as nx
+import osmnx as ox
+
+# Version of the format of the files of PathCache
+PATH_CACHE_VERSION = 2
+# Routing engines of GapRouter
+ROUTING_ENGINES = ('dijkstra', 'astar', 'bidirectional')
+# Scale of the straight line distance used as the A* heuristic, a little less than 1 so the heuristic stays below
+# the edge lengths, which are measured on the earth and not in the projected coordinates
+HEURISTIC_SCALE = 0.99
+
+# The fingerprints of the graphs computed so far, released with the graphs
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+def graph_fingerprint(network_pg):
+    """
+    Returns a string that identifies the nodes, edges and edge lengths of a graph, computed
+    once per graph object and again only if its number of nodes or edges, or its 'weights_version'
+    graph attribute changes. A graph whose edge lengths are changed in place keeps its fingerprint,
+    and so its cached paths, unless its 'weights_version' is changed as well,
+    e.g. network_pg.graph['weights_version'] = network_pg.graph.get('weights_version', 0) + 1
+
+    Parameters:
+    network_pg = A Directed Graph object that contains the data of the transportation network
+    """
+    size = (network_pg.number_of_nodes(), network_pg.number_of_edges(), network_pg.graph.get('weights_version'))
+    if network_pg in _fingerprints and _fingerprints[network_pg][0] == size:
+        return _fingerprints[network_pg][1]
+    key = hashlib.sha256(repr((network_pg.graph.get('crs'), size[:2])).encode())
+    key.update(repr(list(network_pg.nodes)).encode())
+    key.update(repr(list(network_pg.edges(keys=True, data='length'))).encode())
+    fingerprint = key.hexdigest()
+    _fingerprints[network_pg] = (size, fingerprint)
+    return fingerprint
+
+
+def get_weight_function(network_pg, weight):
+    """
+    Returns a function of the edges from one node to another node of a graph that returns
+    their weight, the least weight of parallel edges, 1 for edges without the weight as in networkx
+
+    Parameters:
+    network_pg = A Directed Graph object that contains the data of the transportation network
+    weight = The edge attribute used as the weight
+    """
+    if network_pg.is_multigraph():
+        return lambda edges: min(attrs.get(weight, 1) for attrs in edges.values())
+    return lambda edges: edges.get(weight, 1)
+
+
+def straight_line_distance(network_pg, node1, node2):
+    """
+    Returns the straight line distance between two nodes of a projected graph
+
+    Parameters:
+    network_pg = A Directed Graph object that is projected
+    node1 = The ID of the first node
+    node2 = The ID of the second node
+    """
+    node1 = network_pg.nodes[node1]
+    node2 = network_pg.nodes[node2]
+    return math.hypot(node1['x'] - node2['x'], node1['y'] - node2['y'])
+
+
+def astar_path(network_pg, start_node, end_node, weight='length', max_cost=None):
+    """
+    Returns a list of the nodes on the shortest path between two nodes found by A* search,
+    or None if there is no path or no path costs at most max_cost. The heuristic is the
+    straight line distance to the end node if the weight is 'length', so only the nodes
+    towards the end node are explored. The path is the shortest as long as the edges are
+    at least as long as the straight lines between their nodes, as on a real network
+
+    Parameters:
+    network_pg = A Directed Graph object that is projected
+    start_node = The ID of the node the path starts at
+    end_node = The ID of the node the path ends at
+    weight = The edge attribute minimized by the path
+    max_cost = Optional budget of the cost of the path, the search stops once every path left costs more
+    """
+    if weight == 'length':
+        end = network_pg.nodes[end_node]
+        end_x = end['x']
+        end_y = end['y']
+        nodes = network_pg.nodes
+
+        def heuristic(node):
+            node = nodes[node]
+            return HEURISTIC_SCALE * math.hypot(node['x'] - end_x, node['y'] - end_y)
+    else:
+        def heuristic(node):
+            return 0
+
+    succ = network_pg.succ
+    get_edge_weight = get_weight_function(network_pg, weight)
+    # entries of (estimated cost of the path through the node, cost to the node, tie breaker, node)
+    tie_breaker = count()
+    heap = [(heuristic(start_node), 0, next(tie_breaker), start_node)]
+    costs = {start_node: 0}
+    parents = {start_node: None}
+    visited = set()
+    while heap:
+        estimate, cost, _, node = heapq.heappop(heap)
+        if node in visited:
+            continue
+        if max_cost is not None and estimate > max_cost:
+            return None
+        if node == end_node:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            return path[::-1]
+        visited.add(node)
+        for next_node, edges in succ[node].items():
+            next_cost = cost + get_edge_weight(edges)
+            if next_cost < costs.get(next_node, math.inf):
+                costs[next_node] = next_cost
+                parents[next_node] = node
+                heapq.heappush(heap, (next_cost + heuristic(next_node), next_cost, next(tie_breaker), next_node))
+    return None
+
+
+def bidirectional_path(network_pg, start_node, end_node, weight='length', max_cost=None):
+    """
+    Returns a list of the nodes on the shortest path between two nodes found by searching
+    forwards from the start node and backwards from the end node at once, or None if there
+    is no path or no path costs at most max_cost. The search stops as soon as either side has
+    explored every node it can reach, so an end node that cannot be reached is found early
+
+    Parameters:
+    network_pg = A Directed Graph object that contains the data of the transportation network
+    start_node = The ID of the node the path starts at
+    end_node = The ID of the node the path ends at
+    weight = The edge attribute minimized by the path
+    max_cost = Optional budget of the cost of the path, the search stops once every path left costs more
+    """
+    if start_node == end_node:
+        return [start_node]
+    # the forward search from the start node follows the edges, the backward search from the end node reverses them
+    neighbors = (network_pg.succ, network_pg.pred)
+    get_edge_weight = get_weight_function(network_pg, weight)
+    heaps = ([(0, start_node)], [(0, end_node)])
+    costs = ({start_node: 0}, {end_node: 0})
+    parents = ({start_node: None}, {end_node: None})
+    visited = (set(), set())
+    best_cost = math.inf
+    meeting_node = None
+    while heaps[0] and heaps[1]:
+        # no path found later can cost less than the least costs of both sides together
+        lower_bound = heaps[0][0][0] + heaps[1][0][0]
+        if lower_bound >= best_cost or (max_cost is not None and lower_bound > max_cost):
+            break
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        cost, node = heapq.heappop(heaps[side])
+        if node in visited[side]:
+            continue
+        visited[side].add(node)
+        for next_node, edges in neighbors[side][node].items():
+            next_cost = cost + get_edge_weight(edges)
+            if next_cost < costs[side].get(next_node, math.inf):
+                costs[side][next_node] = next_cost
+                parents[side][next_node] = node
+                heapq.heappush(heaps[side], (next_cost, next_node))
+                if next_node in costs[1 - side] and next_cost + costs[1 - side][next_node] < best_cost:
+                    best_cost = next_cost + costs[1 - side][next_node]
+                    meeting_node = next_node
+
+    if meeting_node is None or (max_cost is not None and best_cost > max_cost):
+        return None
+    path = []
+    node = meeting_node
+    while node is not None:
+        path.append(node)
+        node = parents[0][node]
+    path.reverse()
+    node = parents[1][meeting_node]
+    while node is not None:
+        path.append(node)
+        node = parents[1][node]
+    return path
+
+
+def dijkstra_path(network_pg, start_node, end_node, weight='length', max_cost=None):
+    """
+    Returns a list of the nodes on the shortest path between two nodes found by Dijkstra's algorithm
+    as osmnx does, or None if there is no path or no path costs at most max_cost
+
+    Parameters:
+    network_pg = A Directed Graph object that contains the data of the transportation network
+    start_node = The ID of the node the path starts at
+    end_node = The ID of the node the path ends at
+    weight = The edge attribute minimized by the path
+    max_cost = Optional budget of the cost of the path
+    """
+    if max_cost is None:
+        return ox.distance.shortest_path(network_pg, start_node, end_node, weight=weight)
+    try:
+        return nx.single_source_dijkstra(network_pg, start_node, end_node, cutoff=max_cost, weight=weight)[1]
+    except nx.NetworkXNoPath:
+        return None
+
+
+class GapRouter:
+    """
+    Finds the shortest paths filling gaps with one of the ROUTING_ENGINES: 'dijkstra' as osmnx does,
+    'astar' with the straight line distance heuristic, or 'bidirectional'. With a budget_factor,
+    paths longer than budget_factor times the straight line distance between their nodes plus
+    min_budget are not searched for, and the gap is left unfilled as if there were no path
+    """
+
+    def __init__(self, engine='dijkstra', budget_factor=None, min_budget=0.0):
+        """
+        Parameters:
+        engine = One of ROUTING_ENGINES
+        budget_factor = Optional ratio of the longest path searched for to the straight line distance
+        min_budget = Cost added to the budget, so nodes that are close together are not left without a path
+        """
+        if engine not in ROUTING_ENGINES:
+            raise ValueError('engine must be one of %s' % ', '.join(ROUTING_ENGINES))
+        self.engine = engine
+        self.budget_factor = budget_factor
+        self.min_budget = min_budget
+
+    def __repr__(self):
+        return 'GapRouter(engine=%r, budget_factor=%r, min_budget=%r)' % (self.engine, self.budget_factor,
+                                                                         self.min_budget)
+
+    def __call__(self, network_pg, start_node, end_node, weight='length'):
+        """
+        Returns a list of the nodes on the shortest path between two nodes, or None if there is no path
+        within the budget
+
+        Parameters:
+        network_pg = A Directed Graph object that is projected
+        start_node = The ID of the node the path starts at
+        end_node = The ID of the node the path ends at
+        weight = The edge attribute minimized by the path
+        """
+        max_cost = None
+        if self.budget_factor is not None:
+            max_cost = (self.budget_factor * straight_line_distance(network_pg, start_node, end_node)
+                        + self.min_budget)
+        if self.engine == 'astar':
+            return astar_path(network_pg, start_node, end_node, weight, max_cost)
+        if self.engine == 'bidirectional':
+            return bidirectional_path(network_pg, start_node, end_node, weight, max_cost)
+        return dijkstra_path(network_pg, start_node, end_node, weight, max_cost)
+
+
+class PathCache:
+    """
+    A bounded least recently used cache of shortest paths keyed by
+    (graph fingerprint, start node, end node, weight, router), with counters of its hits and misses.
+    Searches that find no path are cached as well. The cache can be saved to a file and
+    loaded again by later runs. The edge lengths of a graph must not be changed in place while
+    its paths are cached, unless its 'weights_version' is changed too (see graph_fingerprint)
+    """
+
+    def __init__(self, max_size=100000, cache_path=None):
+        """
+        Parameters:
+        max_size = Maximum number of paths kept, the least recently used paths are removed first
+        cache_path = Optional file the cache is loaded from if it exists, and saved to by save
+        """
+        self.max_size = max_size
+        self.cache_path = cache_path
+        self.paths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_path is not None and os.path.isfile(cache_path):
+            self.load(cache_path)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def shortest_path(self, network_pg, start_node, end_node, weight='length', route=None):
+        """
+        Returns a list of the nodes on the shortest path between two nodes, or None if there is no path,
+        from the cache if it has the path or else found by route and added to the cache
+
+        Parameters:
+        network_pg = A Directed Graph object that contains the data of the transportation network
+        start_node = The ID of the node the path starts at
+        end_node = The ID of the node the path ends at
+        weight = The edge attribute minimized by the path
+        route = A GapRouter, or a function of (network_pg, start_node, end_node, weight) with a repr
+                that identifies it, that finds the path, GapRouter() if not given
+        """
+        if route is None:
+            route = GapRouter()
+        key = (graph_fingerprint(network_pg), start_node, end_node, weight, repr(route))
+        if key in self.paths:
+            self.hits += 1
+            self.paths.move_to_end(key)
+            path = self.paths[key]
+            return None if path is None else list(path)
+
+        self.misses += 1
+        path = route(network_pg, start_node, end_node, weight)
+        self.paths[key] = None if path is None else tuple(path)
+        if len(self.paths) > self.max_size:
+            self.paths.popitem(last=False)
+        return path
+
+    def get_stats(self):
+        """
+        Returns a dictionary of the number of hits, misses and paths of the cache
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.paths)}
+
+    def save(self, cache_path=None):
+        """
+        Saves the paths of the cache to a file, written to a temporary file first
+        so a partly written file is never loaded
+
+        Parameters:
+        cache_path = The file to save to, the cache_path of the cache if not given
+        """
+        cache_path = self.cache_path if cache_path is None else cache_path
+        temp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+        with open(temp_path, 'wb') as file:
+            pickle.dump((PATH_CACHE_VERSION, list(self.paths.items())), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+
+    def load(self, cache_path):
+        """
+        Adds the paths saved in a file to the cache, as the most recently used paths,
+        ignoring files saved in another format
+
+        Parameters:
+        cache_path = The file to load from
+        """
+        with open(cache_path, 'rb') as file:
+            version, items = pickle.load(file)
+        if version != PATH_CACHE_VERSION:
+            return
+        for key, path in items:
+            self.paths[key] = path
+            self.paths.move_to_end(key)
+        while len(self.paths) > self.max_size:
+            self.paths.popitem(last=False)
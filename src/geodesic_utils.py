@@ -0,0 +1,209 @@
+"""
+Module Name: Geodesic Utilities
+Source Name: geodesic_utils.py
+Creator: All PyERT-BLACK project team members
+Requirements: Python 3.8 or later
+Date Created: Oct 18, 2026
+Last Revised: Oct 18, 2026
+Description: Implements batched haversine distance functions over arrays of longitudes and
+             latitudes in degrees, shared by Mode Detection and Extractor, and a thinning
+             function keeping points a minimum distance apart.
+
+Version History:
+2026-10-18 (geodesic_utils.py) Create haversine, consecutive_distances, distances_to_point
+    and distances_within_radius functions
+2026-10-18 (geodesic_utils.py) Create thin_points function
+"""
+
+import numpy as np
+from math import sin, asin, sqrt
+
+# radius of earth in meters
+EARTH_RADIUS = 6378137
+
+
+def haversine(lon1, lat1, lon2, lat2, dtype=np.float64):
+    """
+    Returns a numpy array of the distances in meters between each pair of points,
+    the inputs are broadcast against each other
+
+    Parameters:
+    lon1 = Longitudes of the first points
+    lat1 = Latitudes of the first points
+    lon2 = Longitudes of the second points
+    lat2 = Latitudes of the second points
+    dtype = Floating point type used for the calculation, np.float32 trades accuracy
+            for speed and memory
+    """
+    # convert from degrees to radian
+    lon1 = np.radians(np.asarray(lon1, dtype=dtype))
+    lat1 = np.radians(np.asarray(lat1, dtype=dtype))
+    lon2 = np.radians(np.asarray(lon2, dtype=dtype))
+    lat2 = np.radians(np.asarray(lat2, dtype=dtype))
+
+    # Haversine formula
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+
+    c = 2 * np.arcsin(np.sqrt(a))
+
+    return c * dtype(EARTH_RADIUS)
+
+
+def consecutive_distances(lon, lat, dtype=np.float64):
+    """
+    Returns a numpy array of the distances in meters between each point and the point after it,
+    which has one less element than the input
+
+    Parameters:
+    lon = A numpy array of longitudes of the points
+    lat = A numpy array of latitudes of the points
+    dtype = Floating point type used for the calculation
+    """
+    return haversine(lon[:-1], lat[:-1], lon[1:], lat[1:], dtype=dtype)
+
+
+def distances_to_point(lon, lat, point_lon, point_lat, dtype=np.float64):
+    """
+    Returns a numpy array of the distances in meters between each point and a single point
+
+    Parameters:
+    lon = A numpy array of longitudes of the points
+    lat = A numpy array of latitudes of the points
+    point_lon = Longitude of the single point
+    point_lat = Latitude of the single point
+    dtype = Floating point type used for the calculation
+    """
+    return haversine(point_lon, point_lat, lon, lat, dtype=dtype)
+
+
+def distances_within_radius(lon1, lat1, lon2, lat2, radius, dtype=np.float64, block_size=1024):
+    """
+    Returns a tuple of three numpy arrays (indices of the first points, indices of the second points,
+    distances in meters) for every pair of a first point and a second point that are within the radius
+
+    Parameters:
+    lon1 = A numpy array of longitudes of the first points
+    lat1 = A numpy array of latitudes of the first points
+    lon2 = A numpy array of longitudes of the second points
+    lat2 = A numpy array of latitudes of the second points
+    radius = The distance in meters that pairs of points have to be within
+    dtype = Floating point type used for the calculation
+    block_size = Number of first points compared with the second points at a time
+    """
+    lon1 = np.asarray(lon1)
+    lat1 = np.asarray(lat1)
+    # sort the second points by latitude, so only the second points within the latitude range
+    # of each block of first points have to be compared
+    order = np.argsort(lat2, kind='stable')
+    lon2 = np.asarray(lon2)[order]
+    lat2 = np.asarray(lat2)[order]
+    # a difference of latitude of this many degrees is always further than the radius
+    lat_range = np.degrees(radius / EARTH_RADIUS)
+
+    first_ids = []
+    second_ids = []
+    dists = []
+    for start in range(0, len(lon1), block_size):
+        block_lon = lon1[start:start + block_size]
+        block_lat = lat1[start:start + block_size]
+        low = np.searchsorted(lat2, block_lat.min() - lat_range, side='left')
+        high = np.searchsorted(lat2, block_lat.max() + lat_range, side='right')
+        if low >= high:
+            continue
+        block_dists = haversine(block_lon[:, None], block_lat[:, None],
+                                lon2[None, low:high], lat2[None, low:high], dtype=dtype)
+        first, second = np.nonzero(block_dists <= radius)
+        first_ids.append(first + start)
+        second_ids.append(order[second + low])
+        dists.append(block_dists[first, second])
+
+    if not dists:
+        return (np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0, dtype=dtype))
+    return (np.concatenate(first_ids), np.concatenate(second_ids), np.concatenate(dists))
+
+
+def thin_points(lon, lat, min_dist, starts=None):
+    """
+    Returns a boolean numpy array that is True for the points kept, where a point is kept if it is
+    at least min_dist meters from the last kept point, and the first point of each group is always
+    kept, so the last kept point is reset at the start of every group
+
+    Parameters:
+    lon = A numpy array of longitudes of the points
+    lat = A numpy array of latitudes of the points
+    min_dist = Minimum distance in meters between kept points
+    starts = A boolean numpy array that is True for the first point of each group (e.g. trip or device),
+             None if all points are one group
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    num_points = len(lon)
+    keep = np.zeros(num_points, dtype=bool)
+    if num_points == 0:
+        return keep
+
+    # distance from each point to the next point in the same group
+    next_dists = np.full(num_points, np.inf)
+    next_dists[:-1] = consecutive_distances(lon, lat)
+    if starts is None:
+        boundaries = np.zeros(0, dtype=np.intp)
+    else:
+        boundaries = np.flatnonzero(np.asarray(starts, dtype=bool)[1:]) + 1
+        next_dists[boundaries - 1] = np.inf
+    group_ends = boundaries.tolist() + [num_points]
+    # points within min_dist of the next point, every point from the last kept point up to the
+    # next of these is kept since each is far enough from the one before it
+    close = np.flatnonzero(next_dists < min_dist).tolist() + [num_points]
+
+    # the points between are compared with the last kept point one at a time in plain floats,
+    # since they are mostly few, and in windows of growing size after the first scalar_points
+    scalar_points = 32
+    lon_rad = np.radians(lon).tolist()
+    lat_rad = np.radians(lat).tolist()
+    cos_lat = np.cos(np.radians(lat)).tolist()
+    close_pos = 0
+    group_pos = 0
+    anchor = 0
+    while anchor < num_points:
+        while close[close_pos] < anchor:
+            close_pos += 1
+        close_index = close[close_pos]
+        keep[anchor:close_index + 1] = True
+        if close_index >= num_points:
+            break
+        anchor = close_index
+        while group_ends[group_pos] <= anchor:
+            group_pos += 1
+        end = group_ends[group_pos]
+
+        # find the first point of the group at least min_dist from the anchor,
+        # or else start from the first point of the next group
+        next_anchor = end
+        anchor_lon = lon_rad[anchor]
+        anchor_lat = lat_rad[anchor]
+        anchor_cos = cos_lat[anchor]
+        i = anchor + 2
+        scalar_end = min(i + scalar_points, end)
+        while i < scalar_end:
+            a = (sin((lat_rad[i] - anchor_lat) / 2)**2
+                 + anchor_cos * cos_lat[i] * sin((lon_rad[i] - anchor_lon) / 2)**2)
+            if 2 * asin(sqrt(a)) * EARTH_RADIUS >= min_dist:
+                next_anchor = i
+                break
+            i += 1
+        else:
+            window = scalar_points
+            while i < end:
+                stop = min(i + window, end)
+                dists = distances_to_point(lon[i:stop], lat[i:stop], lon[anchor], lat[anchor])
+                far = np.flatnonzero(dists >= min_dist)
+                if far.size:
+                    next_anchor = i + far[0]
+                    break
+                i = stop
+                window *= 2
+        anchor = next_anchor
+
+    return keep
@@ -0,0 +1,156 @@
+"""
+Module Name: GPS Filters
+Source Name: gps_filters.py
+Creator: All PyERT-BLACK project team members
+Requirements: Python 3.8 or later
+Date Created: Oct 18, 2026
+Last Revised: Oct 18, 2026
+Description: Implements the filter stages of GPS Preprocess. Each stage returns a boolean mask of the points
+             it keeps over the same arrays of the points, so the masks of all stages can be combined and
+             the GPS data copied only once.
+
+Version History:
+2026-10-18 (gps_filters.py) Create PointArrays, SpeedCap, FixQualityFilter, SpeedJumpFilter and
+    AccelerationCap classes
+"""
+
+import numpy as np
+import pandas as pd
+from geodesic_utils import consecutive_distances
+
+
+class PointArrays(dict):
+    """
+    Numpy arrays of the columns of GPS points shared by the filter stages, each made on first use.
+    'Timestamp' is the time of each point in integer nanoseconds, parsed from 'LocalTime' if there
+    is no 'Timestamp' column
+    """
+
+    def __init__(self, data, positions=None, time_format=None):
+        """
+        Parameters:
+        data: A DataFrame of GPS points
+        positions: Optional numpy array of the positions of the rows of data to use, in order
+        time_format: Format of the 'LocalTime' column
+        """
+        super().__init__()
+        self.data = data
+        self.positions = positions
+        self.time_format = time_format
+        self.num_points = len(data.index) if positions is None else len(positions)
+
+    def __missing__(self, column):
+        if column == 'Timestamp' and 'Timestamp' not in self.data:
+            values = pd.to_datetime(self.data['LocalTime'], format=self.time_format) \
+                .astype('datetime64[ns]').to_numpy().view(np.int64)
+        elif column == 'Timestamp':
+            values = self.data['Timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        else:
+            values = self.data[column].to_numpy()
+        if self.positions is not None:
+            values = values[self.positions]
+        self[column] = values
+        return values
+
+
+def get_outliers(changes, serial_ids):
+    """
+    Returns a boolean numpy array that is True for the points that change too much both from the
+    previous point and to the next point of the same device, so a single bad point is removed
+    without the point after it
+
+    Parameters:
+    changes = A boolean numpy array that is True where the change between a point and the next is too large
+    serial_ids = A numpy array of the device of each point
+    """
+    changes = changes & (serial_ids[1:] == serial_ids[:-1])
+    outliers = np.zeros(len(serial_ids), dtype=bool)
+    outliers[1:-1] = changes[:-1] & changes[1:]
+    return outliers
+
+
+def get_intervals(times, min_interval):
+    """
+    Returns a numpy array of the seconds between each point and the next point, at least min_interval
+
+    Parameters:
+    times = A numpy array of the times of the points in integer nanoseconds
+    min_interval = Shortest time in seconds between points, so points recorded within the same
+                   minute of 'LocalTime' are taken to be min_interval apart
+    """
+    return np.maximum(np.diff(times) / 10**9, min_interval)
+
+
+class SpeedCap:
+    """
+    Keeps the points whose 'Speed_kmh' is at most max_speed
+    """
+
+    def __init__(self, max_speed=180.0):
+        self.max_speed = max_speed
+
+    def __repr__(self):
+        return 'SpeedCap(max_speed=%r)' % self.max_speed
+
+    def get_mask(self, points):
+        return ~(points['Speed_kmh'] > self.max_speed)
+
+
+class FixQualityFilter:
+    """
+    Keeps the points whose 'DOP' is at most max_dop, or is missing, and whose 'Fix_Status' is one of
+    fix_statuses. Either check is skipped if its parameter is None
+    """
+
+    def __init__(self, max_dop=None, fix_statuses=None):
+        self.max_dop = max_dop
+        self.fix_statuses = None if fix_statuses is None else list(fix_statuses)
+
+    def __repr__(self):
+        return 'FixQualityFilter(max_dop=%r, fix_statuses=%r)' % (self.max_dop, self.fix_statuses)
+
+    def get_mask(self, points):
+        keep = np.ones(points.num_points, dtype=bool)
+        if self.max_dop is not None:
+            keep &= ~(points['DOP'] > self.max_dop)
+        if self.fix_statuses is not None:
+            keep &= np.isin(points['Fix_Status'], self.fix_statuses)
+        return keep
+
+
+class SpeedJumpFilter:
+    """
+    Removes the points whose distance from both the previous and the next point of the same device
+    implies a speed greater than max_speed km/h
+    """
+
+    def __init__(self, max_speed=180.0, min_interval=1.0):
+        self.max_speed = max_speed
+        self.min_interval = min_interval
+
+    def __repr__(self):
+        return 'SpeedJumpFilter(max_speed=%r, min_interval=%r)' % (self.max_speed, self.min_interval)
+
+    def get_mask(self, points):
+        speeds = consecutive_distances(points['longitude'], points['latitude']) * 3.6 \
+            / get_intervals(points['Timestamp'], self.min_interval)
+        return ~get_outliers(speeds > self.max_speed, points['SerialID'])
+
+
+class AccelerationCap:
+    """
+    Removes the points whose 'Speed_kmh' changes from both the previous and to the next point of the
+    same device at more than max_acc m/s^2
+    """
+
+    def __init__(self, max_acc=10.0, min_interval=1.0):
+        self.max_acc = max_acc
+        self.min_interval = min_interval
+
+    def __repr__(self):
+        return 'AccelerationCap(max_acc=%r, min_interval=%r)' % (self.max_acc, self.min_interval)
+
+    def get_mask(self, points):
+        acc = np.abs(np.diff(points['Speed_kmh'].astype(float))) / 3.6 \
+            / get_intervals(points['Timestamp'], self.min_interval)
+        return ~get_outliers(acc > self.max_acc, points['SerialID'])
@@ -0,0 +1,155 @@
+"""
+Module Name: HMM Matching (module for hidden Markov model map-matching of GPS points)
+Source Name: hmm_matching.py
+Creator: All PyERT-BLACK project team members
+Requirements: Python 3.8 or later
+Date Created: Oct 18, 2026
+Last Revised: Oct 18, 2026
+Description: Implements a map-matcher that matches the GPS points of a trip segment onto the
+transportation network as a hidden Markov model, as an alternative to map_point_to_network.
+Every point has a few candidate edges near it, the probability of a point on a candidate edge
+falls with the distance between them, and the probability of moving from a candidate edge of
+a point to a candidate edge of the next point falls with the difference between the route
+distance and the straight line distance between the points. The most likely sequence of
+candidate edges is decoded with the Viterbi algorithm. Route distances are found by searches
+bounded by a radius from the end node of each candidate edge, memoized for the trip segment.
+
+Version History:
+2026-10-18 (hmm_matching.py) Create HMMMatcher class
+"""
+
+import numpy as np
+import networkx as nx
+from network_index import EdgeIndex
+from route_solver import get_points_on_edges
+
+
+class HMMMatcher:
+    """
+    Matches the GPS points of a trip segment onto the transportation network with a hidden Markov model.
+    An HMMMatcher is called like map_point_to_network and returns the same Geodataframe, and can be given
+    to route_choice_gen as its map_matcher
+    """
+
+    def __init__(self, k=10, radius=50.0, sigma=10.0, beta=10.0, search_radius=1000.0, weight='length'):
+        """
+        Parameters:
+        k = Largest number of candidate edges of a point, where the edges of both directions of a street
+            and parallel edges are each a candidate
+        radius = Largest distance in meters between a point and its candidate edges
+        sigma = Standard deviation in meters of the GPS error, the distance between a point and its edge
+        beta = Scale in meters of the difference between the route distance and the straight line distance
+               of consecutive points
+        search_radius = Longest route distance in meters searched for between the candidate edges of
+                        consecutive points. If no candidate edges of consecutive points are connected within it,
+                        the matching starts again from the later point
+        weight = The edge attribute the route distances are measured by
+        """
+        self.k = k
+        self.radius = radius
+        self.sigma = sigma
+        self.beta = beta
+        self.search_radius = search_radius
+        self.weight = weight
+
+    def __repr__(self):
+        return ('HMMMatcher(k=%r, radius=%r, sigma=%r, beta=%r, search_radius=%r, weight=%r)'
+                % (self.k, self.radius, self.sigma, self.beta, self.search_radius, self.weight))
+
+    def __call__(self, points, network_pg, network_pe, edge_index=None):
+        """
+        Returns a Geodataframe of points in a trip segment matched onto the transportation network
+
+        Parameters:
+        points = A Geodataframe that contains the data of GPS points of a trip trajectory
+        network_pg = A Directed Graph object that is projected
+        and contains the data of the transportation network
+        network_pe = A Geodataframe that contains the data of the edges in the Directed Graph network_pg
+        edge_index = An EdgeIndex of network_pe, built here if not given
+        """
+        # Project the sample GPS points to the same CRS as the network dataset
+        points = points.to_crs(network_pe.crs.to_epsg())
+        if edge_index is None:
+            edge_index = EdgeIndex(network_pe)
+        x = points['geometry'].x.to_numpy()
+        y = points['geometry'].y.to_numpy()
+        return get_points_on_edges(points, edge_index, self.match_edges(x, y, network_pg, edge_index))
+
+    def match_edges(self, x, y, network_pg, edge_index):
+        """
+        Returns a list of the positions in edge_index of the edge each point is matched to
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        network_pg = A Directed Graph object that is projected
+        and contains the data of the transportation network
+        edge_index = An EdgeIndex of the edges of network_pg
+        """
+        num_points = len(x)
+        if num_points == 0:
+            return []
+        cand_point, cand_edge, cand_dist = edge_index.candidate_edges(x, y, self.k, self.radius)
+        # The candidates of point i are cand_edge[starts[i]:starts[i+1]]
+        starts = np.searchsorted(cand_point, np.arange(num_points + 1))
+        # The distance along its edge of every point snapped onto every one of its candidate edges
+        cand_offset = edge_index.snap_points(x[cand_point], y[cand_point], cand_edge)[3]
+        cand_length = np.bincount(edge_index.seg_edge, edge_index.seg_length,
+                                  minlength=len(edge_index.edge_ids))[cand_edge]
+        # The start and end nodes of the candidate edges
+        cand_ids = edge_index.edge_ids[cand_edge]
+        cand_u = [edge_id[0] for edge_id in cand_ids]
+        cand_v = [edge_id[1] for edge_id in cand_ids]
+        # log of the probability of every point on each of its candidate edges
+        emission = -0.5 * (cand_dist / self.sigma) ** 2
+        # The route distances from a node to the nodes within search_radius of it, memoized by the node
+        node_dists = {}
+
+        scores = [emission[starts[0]:starts[1]]]
+        # The candidate of the previous point on the most likely path to each candidate,
+        # -1 where the matching starts again
+        back = [np.full(starts[1] - starts[0], -1)]
+        for i in range(1, num_points):
+            prev = np.arange(starts[i-1], starts[i])
+            curr = np.arange(starts[i], starts[i+1])
+            line_dist = np.hypot(x[i] - x[i-1], y[i] - y[i-1])
+
+            # The route distance between every candidate of the previous point and every candidate of
+            # the point, along the rest of the previous edge, the shortest route between the edges and
+            # the start of the edge, or along the edge if both are on the same edge in order
+            between = np.full((len(prev), len(curr)), np.inf)
+            for a, prev_cand in enumerate(prev):
+                source = cand_v[prev_cand]
+                if source not in node_dists:
+                    node_dists[source] = nx.single_source_dijkstra_path_length(
+                        network_pg, source, cutoff=self.search_radius, weight=self.weight)
+                dists_from_source = node_dists[source]
+                between[a] = [dists_from_source.get(cand_u[curr_cand], np.inf) for curr_cand in curr]
+            route_dist = (cand_length[prev] - cand_offset[prev])[:, None] + between + cand_offset[curr][None, :]
+            along_edge = ((cand_edge[prev][:, None] == cand_edge[curr][None, :]) &
+                          (cand_offset[prev][:, None] <= cand_offset[curr][None, :]))
+            route_dist[along_edge] = (cand_offset[curr][None, :] - cand_offset[prev][:, None])[along_edge]
+            route_dist[route_dist > self.search_radius] = np.inf
+
+            # log of the probability of moving between the candidates, and of the most likely path to them
+            transition = -np.abs(route_dist - line_dist) / self.beta
+            path_scores = scores[-1][:, None] + transition
+            best_prev = path_scores.argmax(axis=0)
+            best_scores = path_scores[best_prev, np.arange(len(curr))]
+            if np.isinf(best_scores).all():
+                # no candidates of the points are connected, the matching starts again from the point
+                scores.append(emission[curr])
+                back.append(np.full(len(curr), -1))
+            else:
+                scores.append(best_scores + emission[curr])
+                back.append(best_prev)
+
+        # Follow the most likely path back from the last point, and from the point before
+        # every point the matching starts again from
+        matched = [0] * num_points
+        cand = int(scores[-1].argmax())
+        for i in range(num_points - 1, -1, -1):
+            matched[i] = int(cand_edge[starts[i] + cand])
+            if i > 0:
+                cand = int(back[i][cand]) if back[i][cand] >= 0 else int(scores[i-1].argmax())
+        return matched
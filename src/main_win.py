@@ -28,7 +28,6 @@ Version History:
     from OSM PBF file due to changes made in Network Data Utilities module
 """
 
-import pandas as pd
 import geojsonio as gjsio
 import os
 from pyrosm import OSM
@@ -66,10 +65,10 @@ def main():
     # gps_data_path = '/Users/jasperleung/Documents/GitHub/PyERT-BLACK/quarto-example/data/sample-gps/sample-gps-1.csv'
     # Check if file type and path are valid, raise exception if not
     try:
-        if '.' in gps_data_path[-4:] and '.csv' != gps_data_path[-4:]:
+        if '.' in gps_data_path[-4:] and gps_data_path[-4:] not in ('.csv', '.gpx'):
             raise InvalidFileFormatException()
     except InvalidFileFormatException:
-        print(gps_data_path + ': File format is not .csv\n')
+        print(gps_data_path + ': File format is not .csv or .gpx\n')
         return None
 
     try:
@@ -129,24 +128,28 @@ will be collected from(optional, default 100 meters): ")
 
     # Preprocess GPS data
     print('Preprocessing input GPS data...')
-    gps_data_df = pd.read_csv(gps_data_path)
-    # Check if there is any valid data missing
+    # Read and preprocess the GPS data in chunks, check if there is any valid data missing
+    # the points are only built as geometries for the extracted trips and stops
+    preprocessor = gps_preprocess.GPSPreprocess(lazy_geometry=True)
     try:
-        cols = ['RecordID', 'SerialID', 'LocalTime', 'latitude',
-                'longitude', 'Fix_Status', 'DOP', 'Speed_kmh', 'Limit_kmh']
-        if not gps_data_df.columns.isin(cols).all():
-            raise InvalidDataException()
-    except InvalidDataException:
-        print('Data does not have correct columns\nData needs to have the following columns: ' + cols + '\n')
+        if gps_data_path[-4:] == '.gpx':
+            gps_data_df = preprocessor.load_gpx(gps_data_path)
+        else:
+            gps_data_df = preprocessor.load_csv(gps_data_path)
+    except InvalidDataException as error:
+        # the exception has a message if the columns are there but some values are invalid
+        if str(error):
+            print(str(error) + '\n')
+        else:
+            print('Data does not have correct columns\nData needs to have the following columns: '
+                  + ', '.join(gps_preprocess.GPS_COLUMNS) + '\n')
         return None
-    preprocessor = gps_preprocess.GPSPreprocess(gps_data_df)
-    gps_data_df = preprocessor.get_data()
-    # Check if geometry column is missing
+    # Check if coordinate columns are missing
     try:
-        if 'geometry' not in gps_data_df:
+        if 'longitude' not in gps_data_df or 'latitude' not in gps_data_df:
             raise InvalidGPSDataException()
     except InvalidGPSDataException:
-        print('GPS Data does not have a geometry column\n')
+        print('GPS Data does not have longitude and latitude columns\n')
         return None
     # Detect modes of GPS data
     print('Detecting modes of GPS data...')
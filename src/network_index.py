@@ -0,0 +1,363 @@
+"""
+Module Name: Network Index (module for spatial indexes of the transportation network)
+Source Name: network_index.py
+Creator: All PyERT-BLACK project team members
+Requirements: Python 3.8 or later
+Date Created: Oct 18, 2026
+Last Revised: Oct 18, 2026
+Description: Implements spatial indexes of a projected transportation network that are built
+once per network and queried with all the points of a trip at once, instead of rebuilding
+a spatial index of the network for every point, and a store of the attributes of the edges
+looked up by the integer positions of the edges.
+
+Version History:
+2026-10-18 (network_index.py) Create EdgeIndex class
+2026-10-18 (network_index.py) Add segment table of EdgeIndex and snap_points to project all points
+    onto their edges at once
+2026-10-18 (network_index.py) Create EdgeAttributes class
+2026-10-18 (network_index.py) Create NodeIndex class
+2026-10-18 (network_index.py) Add get_path_coordinates to EdgeAttributes to join the geometries of
+    the edges of a path
+2026-10-18 (network_index.py) Add candidate_edges to EdgeIndex to find the k nearest edges of points
+    within a radius
+2026-10-18 (network_index.py) Find the nearest segments with query_bulk within a growing radius instead of
+    STRtree.nearest_all, and the edges of coordinates with get_num_coordinates, for pygeos 0.9
+"""
+
+import numpy as np
+import pandas as pd
+import pygeos
+from scipy.spatial import cKDTree
+
+# Distance in the units of the CRS of the network from the points within which nearest_segments first looks for
+# the nearest segments, doubled until the nearest segments of all the points are found
+NEAREST_SEARCH_RADIUS = 50.0
+
+
+def get_coordinates_with_index(geometry):
+    """
+    Returns a tuple of two numpy arrays (coordinates of the geometries, position of the geometry of
+    every coordinate), as pygeos.get_coordinates with return_index, which pygeos 0.9 does not have
+
+    Parameters:
+    geometry = A numpy array of pygeos geometries
+    """
+    return (pygeos.get_coordinates(geometry),
+            np.repeat(np.arange(len(geometry)), pygeos.get_num_coordinates(geometry)))
+
+
+class EdgeAttributes:
+    """
+    The attributes of the edges of a transportation network used by map-matching and route choice
+    analysis, as arrays aligned with the integer positions of the edges, so they are looked up
+    without building a row of every OSM tag of an edge
+    """
+
+    def __init__(self, network_pe):
+        """
+        Parameters:
+        network_pe = A Geodataframe that contains the data of the edges in a Directed Graph,
+                     indexed by the (u, v, key) of the edges
+        """
+        # The (u, v, key) IDs of the edges, and the position of every ID
+        self.edge_ids = network_pe.index
+        self.positions = {edge_id: pos for pos, edge_id in enumerate(self.edge_ids)}
+
+        # The names of the streets, as integer codes into the unique names, -1 for edges without a name.
+        # Edges of simplified graphs can have a list of names, which is kept as a tuple
+        names = network_pe['name'] if 'name' in network_pe else pd.Series(np.nan, index=network_pe.index)
+        names = names.map(lambda name: tuple(name) if isinstance(name, list) else name)
+        self.name_codes, self.names = pd.factorize(names)
+
+        num_edges = len(self.edge_ids)
+        self.oneway = (network_pe['oneway'].to_numpy() == True) if 'oneway' in network_pe \
+            else np.zeros(num_edges, dtype=bool)
+        self.length = network_pe['length'].to_numpy(dtype=float) if 'length' in network_pe \
+            else network_pe['geometry'].length.to_numpy()
+        # The geometry of every edge as a pygeos geometry, for vectorized distances
+        self.geometry = pygeos.from_shapely(list(network_pe['geometry']))
+
+    def get_positions(self, edge_ids):
+        """
+        Returns a numpy array of the positions of edges
+
+        Parameters:
+        edge_ids = A list of the (u, v, key) IDs of the edges
+        """
+        return np.array([self.positions[edge_id] for edge_id in edge_ids], dtype=np.intp)
+
+    def get_names(self, edge_pos):
+        """
+        Returns a list of the street names of edges, NaN for edges without a name
+
+        Parameters:
+        edge_pos = A numpy array of the positions of the edges
+        """
+        codes = self.name_codes[np.asarray(edge_pos, dtype=np.intp)]
+        return [self.names[code] if code >= 0 else np.nan for code in codes.tolist()]
+
+    def same_name(self, edge_pos1, edge_pos2):
+        """
+        Returns whether edges are on the same street by name, which edges without a name never are,
+        for single positions or element-wise for numpy arrays of positions
+
+        Parameters:
+        edge_pos1 = The positions of the first edges
+        edge_pos2 = The positions of the second edges
+        """
+        codes = self.name_codes[edge_pos1]
+        return (codes == self.name_codes[edge_pos2]) & (codes >= 0)
+
+    def get_path_coordinates(self, edge_pos):
+        """
+        Returns a numpy array of the coordinates along a path of edges, where the coordinate an edge
+        starts at is dropped if it is the same as the coordinate the edge before it ends at
+
+        Parameters:
+        edge_pos = A numpy array of the positions of the edges on the path, in order
+        """
+        coords, coord_edges = get_coordinates_with_index(self.geometry[np.asarray(edge_pos, dtype=np.intp)])
+        keep = np.ones(len(coords), dtype=bool)
+        keep[1:] = (coord_edges[1:] == coord_edges[:-1]) | np.any(coords[1:] != coords[:-1], axis=1)
+        return coords[keep]
+
+
+class EdgeIndex:
+    """
+    A spatial index of the edges of a projected transportation network. Every edge is exploded
+    into its straight line segments (legs), and an STRtree over the segments finds the nearest
+    segment, and so the nearest edge, of many points in one query. The segments form a table of
+    arrays ordered by edge, so points can also be projected onto the segments of their edges at once
+    """
+
+    def __init__(self, network_pe):
+        """
+        Parameters:
+        network_pe = A Geodataframe that contains the data of the edges in a projected Directed Graph,
+                     indexed by the (u, v, key) of the edges
+        """
+        # The attributes of the edges, the edges are referred to by their positions in its edge_ids
+        self.attributes = EdgeAttributes(network_pe)
+        self.edge_ids = self.attributes.edge_ids
+        coords, coord_edges = get_coordinates_with_index(self.attributes.geometry)
+        num_edges = len(self.edge_ids)
+
+        # A segment goes from every coordinate of an edge to the next coordinate of the same edge
+        starts = np.flatnonzero(coord_edges[:-1] == coord_edges[1:])
+        # The position of the edge of each segment
+        self.seg_edge = coord_edges[starts]
+        # The start and end coordinates of each segment
+        self.seg_start = coords[starts]
+        self.seg_end = coords[starts + 1]
+        self.seg_length = np.hypot(*(self.seg_end - self.seg_start).T)
+        # The position of the first segment of each edge, followed by the number of segments
+        self.edge_seg_start = np.searchsorted(self.seg_edge, np.arange(num_edges + 1))
+        # The distance along its edge from the start of the edge to the start of each segment
+        lengths_before = np.cumsum(self.seg_length) - self.seg_length
+        self.seg_offset = lengths_before - lengths_before[self.edge_seg_start[self.seg_edge]]
+        self.segments = pygeos.linestrings(np.stack([self.seg_start, self.seg_end], axis=1))
+        self.tree = pygeos.STRtree(self.segments)
+
+    def nearest_segments(self, x, y):
+        """
+        Returns a tuple of two numpy arrays (positions of the nearest segments, distances to them)
+        for every point, where the first of the nearest segments in edge order is taken for points
+        equally near to several segments
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        """
+        points = np.stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)], axis=1)
+        near_segs = np.zeros(len(points), dtype=np.intp)
+        near_dists = np.full(len(points), np.inf)
+        # Every segment within a distance of a point intersects the box around the point that far from it,
+        # so the nearest segments of the points with a segment within the radius are all found, and the
+        # radius is doubled for the other points
+        remaining = np.arange(len(points))
+        radius = NEAREST_SEARCH_RADIUS
+        while len(remaining) and len(self.seg_edge):
+            pair_point, pair_seg = self.query_segments(points[remaining], radius)
+            dists = pygeos.distance(pygeos.points(points[remaining[pair_point]]), self.segments[pair_seg])
+            # keep the nearest segment of each point, and the first of its ties
+            order = np.lexsort((pair_seg, dists, pair_point))
+            first = order[np.unique(pair_point[order], return_index=True)[1]]
+            first = first[dists[first] <= radius]
+            near_segs[remaining[pair_point[first]]] = pair_seg[first]
+            near_dists[remaining[pair_point[first]]] = dists[first]
+            found = np.zeros(len(remaining), dtype=bool)
+            found[pair_point[first]] = True
+            remaining = remaining[~found]
+            radius *= 2
+        return near_segs, near_dists
+
+    def query_segments(self, points, radius):
+        """
+        Returns a tuple of two numpy arrays (positions of the points, positions of the segments) of every
+        segment whose bounding box is within radius of a point in both x and y
+
+        Parameters:
+        points = A numpy array of the x and y coordinates of the points, one row per point
+        radius = The distance from the points in the units of the CRS
+        """
+        return self.tree.query_bulk(pygeos.box(points[:, 0] - radius, points[:, 1] - radius,
+                                               points[:, 0] + radius, points[:, 1] + radius))
+
+    def nearest_edge_positions(self, x, y):
+        """
+        Returns a tuple of two numpy arrays (positions of the nearest edges, distances to them) for every point
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        """
+        seg_pos, dists = self.nearest_segments(x, y)
+        return self.seg_edge[seg_pos], dists
+
+    def nearest_edges(self, x, y, return_dist=False):
+        """
+        Returns a list of the (u, v, key) IDs of the nearest edge to every point, or a tuple of the list
+        and a numpy array of the distances to the edges if return_dist is True
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        return_dist = Whether to also return the distances between the points and their nearest edges
+        """
+        edge_pos, dists = self.nearest_edge_positions(x, y)
+        near_edges = list(self.edge_ids[edge_pos])
+        if return_dist:
+            return near_edges, dists
+        return near_edges
+
+    def get_edge_positions(self, edge_ids):
+        """
+        Returns a numpy array of the positions of edges in the index
+
+        Parameters:
+        edge_ids = A list of the (u, v, key) IDs of the edges
+        """
+        return self.attributes.get_positions(edge_ids)
+
+    def snap_points(self, x, y, edge_pos):
+        """
+        Returns a tuple of four numpy arrays (x coordinates of the snapped points, y coordinates of the snapped
+        points, positions of the segments the points are snapped onto, distances along the edges to the
+        snapped points), where every point is projected onto the nearest segment of its edge, or the
+        first of the nearest segments
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        edge_pos = A numpy array of the position of the edge of every point
+        """
+        points = np.stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)], axis=1)
+        edge_pos = np.asarray(edge_pos)
+        # pair every point with every segment of its edge, the pairs of a point are next to each other
+        first_segs = self.edge_seg_start[edge_pos]
+        counts = self.edge_seg_start[edge_pos + 1] - first_segs
+        pair_point = np.repeat(np.arange(len(edge_pos)), counts)
+        pair_seg = np.arange(counts.sum()) + np.repeat(first_segs - (np.cumsum(counts) - counts), counts)
+        projected, ratios, dists = self.project_points(points[pair_point], pair_seg)
+
+        # keep the nearest segment of each point, and the first of its ties
+        order = np.lexsort((pair_seg, dists, pair_point))
+        first = order[np.unique(pair_point[order], return_index=True)[1]]
+        seg_pos = pair_seg[first]
+        return (projected[first, 0], projected[first, 1], seg_pos,
+                self.seg_offset[seg_pos] + ratios[first] * self.seg_length[seg_pos])
+
+    def project_points(self, points, seg_pos):
+        """
+        Returns a tuple of three numpy arrays (coordinates of the projected points, ratios of the distances
+        along the segments to the projected points to the lengths of the segments, distances between the points
+        and the projected points), where every point is projected onto its segment, clamped to the ends of
+        the segment
+
+        Parameters:
+        points = A numpy array of the x and y coordinates of the points, one row per point
+        seg_pos = A numpy array of the position of the segment of every point
+        """
+        starts = self.seg_start[seg_pos]
+        vectors = self.seg_end[seg_pos] - starts
+        offsets = points - starts
+        length_sq = (vectors ** 2).sum(axis=1)
+        ratios = np.zeros(len(seg_pos))
+        np.divide((offsets * vectors).sum(axis=1), length_sq, out=ratios, where=length_sq > 0)
+        ratios = ratios.clip(0, 1)
+        projected = starts + ratios[:, None] * vectors
+        return projected, ratios, np.hypot(*(points - projected).T)
+
+    def candidate_edges(self, x, y, k, radius):
+        """
+        Returns a tuple of three numpy arrays (positions of the points, positions of the candidate edges,
+        distances between the points and the edges) of up to k candidate edges within radius of every point,
+        ordered by point and then by distance. A point without any edge within radius has its nearest edge
+        as its only candidate
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        k = Largest number of candidate edges of a point
+        radius = Largest distance between a point and its candidate edges, in the units of the CRS
+        """
+        points = np.stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)], axis=1)
+        num_points = len(points)
+        # the segments whose bounding boxes are within radius of the points, and the distances to them
+        pair_point, pair_seg = self.query_segments(points, radius)
+        dists = self.project_points(points[pair_point], pair_seg)[2]
+        within = dists <= radius
+        pair_point, pair_edge, dists = pair_point[within], self.seg_edge[pair_seg[within]], dists[within]
+
+        # the nearest points nowhere near an edge are matched onto
+        missing = np.setdiff1d(np.arange(num_points), pair_point)
+        if len(missing):
+            missing_edge, missing_dists = self.nearest_edge_positions(points[missing, 0], points[missing, 1])
+            pair_point = np.concatenate([pair_point, missing])
+            pair_edge = np.concatenate([pair_edge, missing_edge])
+            dists = np.concatenate([dists, missing_dists])
+
+        # keep the nearest segment of every pair of a point and an edge, then the k nearest edges of every point
+        order = np.lexsort((pair_edge, dists, pair_point))
+        pair_point, pair_edge, dists = pair_point[order], pair_edge[order], dists[order]
+        first = np.unique(pair_point * len(self.edge_ids) + pair_edge, return_index=True)[1]
+        first.sort()
+        pair_point, pair_edge, dists = pair_point[first], pair_edge[first], dists[first]
+        rank = np.arange(len(pair_point)) - np.searchsorted(pair_point, pair_point)
+        keep = rank < k
+        return pair_point[keep], pair_edge[keep], dists[keep]
+
+
+class NodeIndex:
+    """
+    A k-d tree of the nodes of a projected transportation network, built once per network
+    and queried with many points at once
+    """
+
+    def __init__(self, network_pn):
+        """
+        Parameters:
+        network_pn = A Geodataframe that contains the data of the nodes in a projected Directed Graph,
+                     indexed by the IDs of the nodes, with 'x' and 'y' columns
+        """
+        # The IDs of the nodes, in the order of the points of the tree
+        self.node_ids = network_pn.index.to_numpy()
+        self.tree = cKDTree(np.stack([network_pn['x'].to_numpy(dtype=float),
+                                      network_pn['y'].to_numpy(dtype=float)], axis=1))
+
+    def nearest_nodes(self, x, y, return_dist=False):
+        """
+        Returns a list of the IDs of the nearest node to every point, or a tuple of the list
+        and a numpy array of the distances to the nodes if return_dist is True
+
+        Parameters:
+        x = A numpy array of x coordinates of the points in the CRS of the network
+        y = A numpy array of y coordinates of the points in the CRS of the network
+        return_dist = Whether to also return the distances between the points and their nearest nodes
+        """
+        points = np.stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)], axis=1)
+        dists, node_pos = self.tree.query(points, k=1)
+        near_nodes = self.node_ids[node_pos].tolist()
+        if return_dist:
+            return near_nodes, dists
+        return near_nodes
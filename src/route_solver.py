@@ -4,7 +4,7 @@ Source Name: route_solver.py
 Creator: Hongzhao Tan (tanh10@mcmaster.ca)
 Requirements: Python 3.8 or later
 Date Created: Jan 31, 2023
-Last Revised: Feb 13, 2023
+Last Revised: Oct 18, 2026
 Description: Implements methods that are used to generate map-matched route 
 or shortest path from GPS trajectory. A GPS trajectory consists of streams of points recorded 
 by a GPS device that captures movement at a given period.
@@ -36,16 +36,55 @@ point of two or more streets.
 2023-03-19 (route_solver.py) update map_point_to_network function to print progress bar in console 
     to show the progress of finding the nearest edges of GPS points and snapping the GPS points
     onto their nearest edges
+
+2026-10-18 (route_solver.py) Find the nearest edges of all GPS points of a trip at once with an
+    EdgeIndex built once per network, instead of rebuilding a spatial index for every point
+
+2026-10-18 (route_solver.py) Snap all GPS points onto the nearest legs of their edges at once with
+    the segment table of EdgeIndex, and add the distance along the edges of the snapped points
+
+2026-10-18 (route_solver.py) Look up the names, one-way flags and geometries of edges by their
+    integer positions in the EdgeAttributes of EdgeIndex
+
+2026-10-18 (route_solver.py) Look up the shortest paths filling gaps in a PathCache shared by
+    all the trip segments of route_choice_gen
+
+2026-10-18 (route_solver.py) Add gap_router to route gaps with a selected GapRouter engine and budget
+
+2026-10-18 (route_solver.py) Find the nearest nodes of all matched points of a trip at once with a
+    NodeIndex built once per network, instead of two nearest_nodes calls for every gap
+
+2026-10-18 (route_solver.py) Take the edges of a filled gap from the nodes of its shortest route in
+    filled_gap_edges, instead of map-matching the nodes again, and join the geometries of the edges
+    into the geometry of the filled gap
+
+2026-10-18 (route_solver.py) Look up the filled gaps of connect_points_and_filled_gaps in a dictionary
+    keyed by the 'SerialID','OrigPointRecordID' of their start points, instead of comparing every point
+    with all the filled gaps
+
+2026-10-18 (route_solver.py) Separate routing the trip segment of one serial ID out from route_choice_gen
+    as a new function route_serial, and add processes to route_choice_gen to route the serial IDs
+    in a pool of processes sharing the network
+
+2026-10-18 (route_solver.py) Separate snapping the matched points onto their edges out from the
+    implementation of map_point_to_network as a new function get_points_on_edges, and add map_matcher
+    to route_choice_gen to match the GPS points with a selected map-matcher such as an HMMMatcher
 """
 
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-import osmnx as ox
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pygeos
 from shapely.geometry import Point, LineString
 from Progressbar import Progressbar
+from network_index import EdgeIndex, NodeIndex
+from gap_routing import PathCache, GapRouter
 
-def route_choice_gen(trip, network_graph, network_edges, network_nodes):
+def route_choice_gen(trip, network_graph, network_edges, network_nodes, path_cache=None, gap_router=None,
+                     processes=1, map_matcher=None):
     """
     Returns a Geodataframe where each row contains a route 
     by matching GPS trip trajectories onto the transportation network
@@ -58,51 +97,45 @@ def route_choice_gen(trip, network_graph, network_edges, network_nodes):
                     in the Directed Graph network_graph
     network_nodes = A Geodataframe that contains the data of the nodes 
                     in the Directed Graph network_graph
+    path_cache = A PathCache of the shortest paths filling gaps, e.g. one saved by an earlier run,
+                 a new PathCache is shared by the trip segments if not given
+    gap_router = A GapRouter that finds the shortest paths filling gaps, e.g. GapRouter('astar', budget_factor=3),
+                 GapRouter() routing as osmnx does if not given
+    processes = Number of processes the trip segments of different serial IDs are routed in,
+                None for the number of CPUs. Each process gets its own copy of path_cache,
+                so the shortest paths found in a process are not added to the given path_cache
+    map_matcher = A function called like map_point_to_network that matches the GPS points onto the network,
+                  e.g. an HMMMatcher, map_point_to_network if not given
     """
-
-    network_epsg = network_graph.graph['crs'].to_epsg()
+    # Build the spatial indexes of the edges and nodes once for all the trip segments
+    edge_index = EdgeIndex(network_edges)
+    node_index = NodeIndex(network_nodes)
+    if path_cache is None:
+        path_cache = PathCache()
+    network = (network_graph, network_edges, network_nodes, edge_index, node_index, path_cache, gap_router,
+               map_matcher)
     # Find unique serial IDs extract trip segments with each unique serial ID
     unique_serials = list(trip['SerialID'].value_counts().index)
+    serial_points = [trip[trip['SerialID'] == serial_id] for serial_id in unique_serials]
+    processes = min(processes or os.cpu_count() or 1, len(serial_points))
+
+    if processes <= 1:
+        serial_routes = [route_serial(points, *network) for points in serial_points]
+    else:
+        # The network and its indexes are given to every process once when the process starts,
+        # which forked processes share with this process until they are written to,
+        # and map keeps the routes in the same order as unique_serials
+        start_methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in start_methods else None)
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context,
+                                 initializer=_init_route_worker, initargs=network) as executor:
+            serial_routes = list(executor.map(_route_serial_worker, serial_points,
+                                              chunksize=max(1, len(serial_points) // (4 * processes))))
+
     # Initialize lists to contain generated routes
-    routes = []
+    routes = [route for route, _ in serial_routes]
     # Initialize list of lists that contains IDs of edges each of the routes has on
-    edges_route_passed = []
-    for serial_id in unique_serials:
-        # extract trip segments with each unique serial ID
-        curr_serial_points = trip[trip['SerialID'] == serial_id]
-        # Matching points to the network data
-        print('Matching GPS points onto transportation network...')
-        points_on_net = map_point_to_network(
-            curr_serial_points, network_graph, network_edges)
-        # Because the matched points have not been projected to any CRS yet,
-        # we need to first project them to the CRS of the network dataset
-        points_on_net = points_on_net.set_crs(epsg=network_epsg)
-
-        # Detecting gaps between the points and fill the gaps
-        print('Detecting and filling gaps within matched GPS points...')
-        points_on_net, filled_gaps = detect_and_fill_gap(
-            points_on_net, network_graph, network_nodes, network_edges)
-
-        # Then project to the global geographic CRS with EPSG number 4326
-        # for future visualizing the matched points
-        point_on_net_geo_crs = points_on_net.to_crs(epsg=4326)
-        # Same as the points, we need to set the CRS for the filled gaps
-        filled_gaps = filled_gaps.set_crs(epsg=network_epsg)
-        filled_gaps_geocrs = filled_gaps.to_crs(epsg=4326)
-
-        # Connecting the matched points and the filled gaps
-        # to generate full route for the trip segment
-        routes.append(connect_points_and_filled_gaps(
-            point_on_net_geo_crs, filled_gaps_geocrs))
-
-        # Get all IDs of unique edges the route generated
-        # for current trip segment has passed through
-        tmp_edge_ids_set = set(
-            point_on_net_geo_crs['nearEdgeID'].value_counts().index)
-        for i in range(len(filled_gaps)):
-            tmp_set = set(filled_gaps.loc[i]['EdgesGapPassed'])
-            tmp_edge_ids_set = tmp_edge_ids_set.union(tmp_set)
-        edges_route_passed.append(tmp_edge_ids_set)
+    edges_route_passed = [edge_ids for _, edge_ids in serial_routes]
 
     temp_df = pd.DataFrame({'SerialID': unique_serials,
                             'edgesRoutePassed': edges_route_passed,
@@ -110,8 +143,88 @@ def route_choice_gen(trip, network_graph, network_edges, network_nodes):
     routes_gdf = gpd.GeoDataFrame(temp_df, geometry='geometry')
     return routes_gdf
 
+def route_serial(points, network_graph, network_edges, network_nodes, edge_index=None, node_index=None,
+                 path_cache=None, gap_router=None, map_matcher=None):
+    """
+    Returns a tuple (route LineString in the CRS with EPSG number 4326, set of IDs of the edges the route
+    has passed through) by matching the GPS points of the trip segment of one serial ID onto the
+    transportation network
+
+    Parameters:
+    points = A Geodataframe that contains the data of GPS points of the trip segment of one serial ID
+    network_graph = A Directed Graph object that is projected and 
+                    contains the data of the transportation network
+    network_edges = A Geodataframe that contains the data of the edges 
+                    in the Directed Graph network_graph
+    network_nodes = A Geodataframe that contains the data of the nodes 
+                    in the Directed Graph network_graph
+    edge_index = An EdgeIndex of network_edges, built here if not given
+    node_index = A NodeIndex of network_nodes, built here if not given
+    path_cache = A PathCache of the shortest paths filling gaps, a new PathCache if not given
+    gap_router = A GapRouter that finds the shortest paths filling gaps, GapRouter() if not given
+    map_matcher = A function called like map_point_to_network that matches the GPS points onto the network,
+                  map_point_to_network if not given
+    """
+    if map_matcher is None:
+        map_matcher = map_point_to_network
+    network_epsg = network_graph.graph['crs'].to_epsg()
+    # Matching points to the network data
+    print('Matching GPS points onto transportation network...')
+    points_on_net = map_matcher(
+        points, network_graph, network_edges, edge_index)
+    # Because the matched points have not been projected to any CRS yet,
+    # we need to first project them to the CRS of the network dataset
+    points_on_net = points_on_net.set_crs(epsg=network_epsg)
+
+    # Detecting gaps between the points and fill the gaps
+    print('Detecting and filling gaps within matched GPS points...')
+    points_on_net, filled_gaps = detect_and_fill_gap(
+        points_on_net, network_graph, network_nodes, network_edges, edge_index, path_cache, gap_router,
+        node_index)
+
+    # Then project to the global geographic CRS with EPSG number 4326
+    # for future visualizing the matched points
+    point_on_net_geo_crs = points_on_net.to_crs(epsg=4326)
+    # Same as the points, we need to set the CRS for the filled gaps
+    filled_gaps = filled_gaps.set_crs(epsg=network_epsg)
+    filled_gaps_geocrs = filled_gaps.to_crs(epsg=4326)
+
+    # Connecting the matched points and the filled gaps
+    # to generate full route for the trip segment
+    route = connect_points_and_filled_gaps(point_on_net_geo_crs, filled_gaps_geocrs)
+
+    # Get all IDs of unique edges the route generated
+    # for current trip segment has passed through
+    tmp_edge_ids_set = set(
+        point_on_net_geo_crs['nearEdgeID'].value_counts().index)
+    for i in range(len(filled_gaps)):
+        tmp_set = set(filled_gaps.loc[i]['EdgesGapPassed'])
+        tmp_edge_ids_set = tmp_edge_ids_set.union(tmp_set)
+    return route, tmp_edge_ids_set
+
+# The network, indexes, path cache and gap router that route_serial is called with in a worker process
+_worker_network = None
+
+def _init_route_worker(*network):
+    """
+    Keeps the network given to a worker process of route_choice_gen when the process starts
+
+    Parameters:
+    network = The arguments of route_serial after the points
+    """
+    global _worker_network
+    _worker_network = network
 
-def map_point_to_network(points, network_pg, network_pe):
+def _route_serial_worker(points):
+    """
+    Returns route_serial of the points of one serial ID on the network of the worker process
+
+    Parameters:
+    points = A Geodataframe that contains the data of GPS points of the trip segment of one serial ID
+    """
+    return route_serial(points, *_worker_network)
+
+def map_point_to_network(points, network_pg, network_pe, edge_index=None):
     """
     Returns a Geodataframe of points in a trip segment matched onto the transportation network
 
@@ -120,96 +233,63 @@ def map_point_to_network(points, network_pg, network_pe):
     network_pg = A Directed Graph object that is projected 
     and contains the data of the transportation network
     network_pe = A Geodataframe that contains the data of the edges in the Directed Graph network_pg
+    edge_index = An EdgeIndex of network_pe, built here if not given
     """
-    # Coordinates of points after matching
-    point_on_net = []
-    # The edge IDs of the edges that each of the matched points is on
-    near_edges_id = []
-    # The edge names of the edges that each of the matched points is on
-    near_edges_name = []
-    # Coordinates of the leg(a straight line segment in an edge)
-    # that each of the matched points is on
-    near_legs_geo = []
-
     # Project the sample GPS points to the same CRS as the network dataset
     network_epsg = network_pe.crs.to_epsg()
     points = points.to_crs(network_epsg)
 
     # Count the number of GPS points
     num_of_points = len(list(points['geometry']))
-    # Finding the nearest edge for every sample GPS point and take the edges' IDs
-    # intialize counter for finding edges, print empty progress bar
+    # Finding the nearest edge for every sample GPS point at once and take the edges' IDs
     print('Finding nearest edges on the network to the GPS points...')
-    find_edge_counter = 0
-    progress = Progressbar(find_edge_counter, num_of_points)
-    progress.print_progress_bar(prefix = 'Progress', length=50)
-    for point in points['geometry']:
-        near_edge = ox.distance.nearest_edges(
-            network_pg, point.x, point.y, return_dist=True)
-        # print(networkE.loc[near_edge[0]]['name'])
-        near_edges_id.append(near_edge[0])
-        # nearEdgesDist.append(near_edge[1])
-
-        # Update counter and progress bar
-        find_edge_counter += 1
-        if (find_edge_counter+1) < num_of_points:
-            progress = Progressbar(find_edge_counter+1, num_of_points)
-            progress.print_progress_bar(prefix = 'Progress:', length = 50)
-        elif (find_edge_counter+1) == num_of_points:
-            progress = Progressbar(find_edge_counter+1, num_of_points)
-            progress.print_progress_bar(prefix = 'Progress:', suffix = 'Complete', length = 50)
-
-    # For the each sample GPS point, find the nearest leg on its nearest edges,
-    # and find the nearest point on the nearest leg to the sample GPS point
+    if edge_index is None:
+        edge_index = EdgeIndex(network_pe)
+    edge_attributes = edge_index.attributes
+    # The positions of the edges that each of the matched points is on
+    near_edges_pos = edge_index.nearest_edge_positions(
+        points['geometry'].x.to_numpy(), points['geometry'].y.to_numpy())[0].tolist()
+    if num_of_points > 0:
+        progress = Progressbar(num_of_points, num_of_points)
+        progress.print_progress_bar(prefix = 'Progress:', suffix = 'Complete', length = 50)
+
+    # For the each sample GPS point, correct its nearest edge if it could be on an intersection
+    # or on the wrong side of a street, and find the nearest point on the nearest leg of
+    # the edge to the sample GPS point
     # intialize counter for snapping points onto edges, 
     # print empty progress bar
     print('Snapping GPS points onto their nearest edges...')
     snap_point_counter = 0
     progress = Progressbar(snap_point_counter, num_of_points)
     progress.print_progress_bar(prefix = 'Progress', length=50)
-    for i, edge in enumerate(near_edges_id):
-        if 1 <= i < (len(near_edges_id)-1):
+    same_name = edge_attributes.same_name
+    for i in range(len(near_edges_pos)):
+        if 1 <= i < (len(near_edges_pos)-1):
             # If current GPS point is on a different street from the following 
             # and the following and former GPS points are on the same street
             # current GPS point could be crossing an interesction of two streets
-            if ((network_pe.loc[near_edges_id[i-1]]['name'] == network_pe.loc[near_edges_id[i+1]]['name']) and
-                    (network_pe.loc[near_edges_id[i]]['name'] != network_pe.loc[near_edges_id[i+1]]['name'])):
-                near_edges_id[i] = near_edges_id[i-1]
+            if (same_name(near_edges_pos[i-1], near_edges_pos[i+1]) and
+                    not same_name(near_edges_pos[i], near_edges_pos[i+1])):
+                near_edges_pos[i] = near_edges_pos[i-1]
             
             # If current GPS point is on the same street(by street name) from the former one 
             # but the GPS points' corresponding edge ids are different 
             # and the street currtent GPS point is on is one-way
             # current GPS point could be crossing wrongly assgined to the other side of the street
-            if ((network_pe.loc[near_edges_id[i]]['name'] == network_pe.loc[near_edges_id[i-1]]['name']) and
-                    (near_edges_id[i] != near_edges_id[i-1]) and
-                    (network_pe.loc[near_edges_id[i]]['oneway'] == True)):
-                near_edges_id[i] = near_edges_id[i-1]
+            if (same_name(near_edges_pos[i], near_edges_pos[i-1]) and
+                    (near_edges_pos[i] != near_edges_pos[i-1]) and
+                    edge_attributes.oneway[near_edges_pos[i]]):
+                near_edges_pos[i] = near_edges_pos[i-1]
 
         # if the last GPS point is on a different street from the second last GPS point,
         # check the distance between the edges they are on,
         # if the distance is not greater than 10 meters,
         # the last GPS point could be on a interesction of two streets
-        if i == (len(near_edges_id)-1):
-            if ((network_pe.loc[near_edges_id[i]]['name'] != network_pe.loc[near_edges_id[i-1]]['name']) and
-                    (network_pe.loc[near_edges_id[i]]['geometry'].distance(network_pe.loc[near_edges_id[i-1]]['geometry']) <= 10)):
-                near_edges_id[i] = near_edges_id[i-1]
-
-        # Get the coordinates of the nearest edge of current GPS point
-        near_edges_name.append(network_pe.loc[near_edges_id[i]]['name'])
-        near_edge_geo = network_pe.loc[near_edges_id[i]]['geometry']
-        near_edge_coord = list(near_edge_geo.coords)
-
-        # find the nearest leg on the nearest edge of current GPS point
-        near_leg = LineString([near_edge_coord[0], near_edge_coord[1]])
-        near_leg_dist = near_leg.distance(points['geometry'][i])
-        for i in range(1, len(near_edge_coord)-1):
-            curr_leg = LineString([near_edge_coord[i], near_edge_coord[i+1]])
-            curr_dist = curr_leg.distance(points['geometry'][i])
-            if curr_dist < near_leg_dist:
-                near_leg = curr_leg
-        # find the nearest point on the nearest leg to the sample GPS point
-        point_on_net.append(near_leg.interpolate(near_leg.project(list(points['geometry'])[i])))
-        near_legs_geo.append(near_leg)
+        if i == (len(near_edges_pos)-1):
+            if (not same_name(near_edges_pos[i], near_edges_pos[i-1]) and
+                    (pygeos.distance(edge_attributes.geometry[near_edges_pos[i]],
+                                     edge_attributes.geometry[near_edges_pos[i-1]]) <= 10)):
+                near_edges_pos[i] = near_edges_pos[i-1]
 
         # Update counter and progress bar
         snap_point_counter += 1
@@ -220,20 +300,44 @@ def map_point_to_network(points, network_pg, network_pe):
             progress = Progressbar(snap_point_counter+1, num_of_points)
             progress.print_progress_bar(prefix = 'Progress:', suffix = 'Complete', length = 50)
 
+    return get_points_on_edges(points, edge_index, near_edges_pos)
+
+def get_points_on_edges(points, edge_index, near_edges_pos):
+    """
+    Returns a Geodataframe of points in a trip segment snapped onto the edges they are matched to
+
+    Parameters:
+    points = A Geodataframe that contains the data of GPS points of a trip trajectory,
+             in the same CRS as the network dataset
+    edge_index = An EdgeIndex of the edges of the network
+    near_edges_pos = A list of the positions in edge_index of the edge each of the points is matched to
+    """
+    edge_attributes = edge_index.attributes
+    # find the nearest leg(a straight line segment in an edge) on the nearest edge
+    # of every GPS point, and the nearest point on the nearest leg to the GPS point
+    snapped_x, snapped_y, near_legs, near_edges_offset = edge_index.snap_points(
+        points['geometry'].x.to_numpy(), points['geometry'].y.to_numpy(), near_edges_pos)
+    # Coordinates of the leg that each of the matched points is on
+    near_legs_geo = gpd.GeoSeries.from_wkb(pygeos.to_wkb(pygeos.linestrings(
+        np.stack([edge_index.seg_start[near_legs], edge_index.seg_end[near_legs]], axis=1))))
+
     # Create a dataframe for the points after matching
     temp_df = pd.DataFrame({'SerialID': list(points['SerialID']),
                             'RecordID': list(points['RecordID']),
-                            'nearEdgeID': near_edges_id,
-                            'nearEdgeName': near_edges_name,
-                            'nearLeg': near_legs_geo,
-                            'geometry': point_on_net})
+                            # The edge IDs and names of the edges that each of the matched points is on
+                            'nearEdgeID': list(edge_attributes.edge_ids[near_edges_pos]),
+                            'nearEdgeName': edge_attributes.get_names(near_edges_pos),
+                            'nearEdgeOffset': near_edges_offset,
+                            'nearLeg': near_legs_geo.values,
+                            'geometry': gpd.points_from_xy(snapped_x, snapped_y)})
 
     # Convert the dataframe into a geodataframe
     points_on_net_gdf = gpd.GeoDataFrame(temp_df, geometry='geometry')
     return points_on_net_gdf
 
 
-def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
+def detect_and_fill_gap(points, network_pg, network_pn, network_pe, edge_index=None, path_cache=None,
+                        gap_router=None, node_index=None):
     """
     Detects gaps from GPS points in trip trajectory 
     and returns a Geodataframe where each row contains a route 
@@ -244,7 +348,26 @@ def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
     network_pg = A Directed Graph object that is projected 
     and contains the data of the transportation network
     network_pn = A Geodataframe that contains the data of the nodes in the Directed Graph network_pg
+    network_pe = A Geodataframe that contains the data of the edges in the Directed Graph network_pg
+    edge_index = An EdgeIndex of network_pe, built here if not given
+    path_cache = A PathCache the shortest paths are looked up in, a new PathCache if not given
+    gap_router = A GapRouter that finds the shortest paths, GapRouter() if not given
+    node_index = A NodeIndex of network_pn, built here if not given
     """
+    if edge_index is None:
+        edge_index = EdgeIndex(network_pe)
+    if path_cache is None:
+        path_cache = PathCache()
+    if gap_router is None:
+        gap_router = GapRouter()
+    if node_index is None:
+        node_index = NodeIndex(network_pn)
+    edge_attributes = edge_index.attributes
+    # The positions of the edges that the matched points are on
+    points_edge_pos = edge_attributes.get_positions(points['nearEdgeID'])
+    # The nodes in the network dataset that are nearest to the matched points, found at once
+    # for the start and end points of all gaps
+    points_node = node_index.nearest_nodes(points['geometry'].x.to_numpy(), points['geometry'].y.to_numpy())
     # The track IDs of the start points of the gaps
     gaps_orig_record_id = []
     # The episode IDs of the start points of the gaps
@@ -258,25 +381,25 @@ def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
     for i in range(1, len(points)):
         # Gap exists when the two adjacent points are not on the same edge in the network dataset
         # and the distance between them exceeds 50 meters.
-        if (((points.loc[i-1]['nearEdgeID'] != points.loc[i]['nearEdgeID']) and
-                (points.loc[i-1]['geometry'].distance(points.loc[i]['geometry'])) > 50) or
-            (points.loc[i-1]['nearEdgeName'] != points.loc[i]['nearEdgeName'])):
+        if (((points_edge_pos[i-1] != points_edge_pos[i]) and
+                (points.at[i-1, 'geometry'].distance(points.at[i, 'geometry'])) > 50) or
+            not edge_attributes.same_name(points_edge_pos[i-1], points_edge_pos[i])):
             #print((points.loc[i-1]['RecordID'], points.loc[i]['RecordID']))
             # print(points.loc[i-1]['geometry'].distance(points.loc[i]['geometry']))
 
-            # Find the two nodes in the network dataset that are nearest to the start
+            # Get the two nodes in the network dataset that are nearest to the start
             # and end points of the gap respectively
-            start_node = ox.distance.nearest_nodes(
-                network_pg, points.loc[i-1]['geometry'].x, points.loc[i-1]['geometry'].y)
-            end_node = ox.distance.nearest_nodes(
-                network_pg, points.loc[i]['geometry'].x, points.loc[i]['geometry'].y)
+            start_node = points_node[i-1]
+            end_node = points_node[i]
             # Find the shortest route between the two nodes found
-            shortest_route = ox.distance.shortest_path(network_pg,
-                                                       start_node,
-                                                       end_node,
-                                                       weight='length')
+            shortest_route = path_cache.shortest_path(network_pg,
+                                                      start_node,
+                                                      end_node,
+                                                      weight='length',
+                                                      route=gap_router)
             #print(shortest_route)
-            # if a shortest path cannot be found for the gap, continue the iteration
+            # if a shortest path cannot be found for the gap, or not within the budget
+            # of the gap router, continue the iteration
             if shortest_route == None:
                 continue
 
@@ -284,25 +407,23 @@ def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
             gaps_orig_record_id.append(points.loc[i-1]['RecordID'])
             gaps_orig_eps_id.append(points.loc[i-1]['SerialID'])
 
-            # Get the coordinates of the nodes on the shortest route
-            shortest_route_geo = [(network_pn.loc[nodeID]['geometry'].x,
-                                    network_pn.loc[nodeID]['geometry'].y)
-                                    for nodeID in shortest_route]
-            if len(shortest_route_geo) == 1:
-                shortest_route_geo.insert(0,(points.loc[i-1]['geometry'].x,
-                                                points.loc[i-1]['geometry'].y))
-                shortest_route_geo.append((points.loc[i]['geometry'].x,points.loc[i]['geometry'].y))
-            # print(shortest_route_geo)
-            # Turning coordinates on shortest route to Point objects
-            shortest_route_points = [Point(point_geo) for point_geo in shortest_route_geo]
             # Get the IDs of edges in the network that the filled gap has passed through
             # and add them into the list edges_gaps_passed
-            shortest_route_edges = filled_gap_edges(points.loc[i-1]['SerialID'],
-                                                    points.loc[i-1]['RecordID'],
-                                                    shortest_route_points, network_pg, network_pe)
+            shortest_route_edges = filled_gap_edges(shortest_route, network_pg)
             edges_gaps_passed.append(shortest_route_edges)
 
-            # Connect the coordinates of the nodes on the shortest route into one LineString
+            # Get the coordinates along the edges on the shortest route
+            if len(shortest_route_edges) == 0:
+                # the gap is within one node, so it goes from the start point through the node to the end point
+                route_node = network_pn.loc[shortest_route[0]]['geometry']
+                shortest_route_geo = [(points.loc[i-1]['geometry'].x, points.loc[i-1]['geometry'].y),
+                                      (route_node.x, route_node.y),
+                                      (points.loc[i]['geometry'].x, points.loc[i]['geometry'].y)]
+            else:
+                shortest_route_geo = [tuple(coord) for coord in edge_attributes.get_path_coordinates(
+                    edge_attributes.get_positions(shortest_route_edges)).tolist()]
+
+            # Connect the coordinates along the shortest route into one LineString
             filled_gaps_line.append(LineString(shortest_route_geo))
 
             # Check to see if the filled gap went over following points,
@@ -314,6 +435,9 @@ def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
                 # print(filled_gaps_line[-1].distance(points.loc[j]['geometry']))
                 if filled_gaps_line[-1].distance(points.loc[j]['geometry']) < 1e-8:
                     points.at[j, 'geometry'] = Point(shortest_route_geo[-1])
+                    # the point is moved onto the end node of the filled gap, or onto the end point
+                    # of a gap within one node, so the end node is its nearest node
+                    points_node[j] = end_node
                     # print((points.loc[j]['geometry'].x,points.loc[j]['geometry'].y))
                 else:
                     break
@@ -329,36 +453,24 @@ def detect_and_fill_gap(points, network_pg, network_pn, network_pe):
     # we also need to return the points
     return points, filled_gaps_gdf
 
-def filled_gap_edges(orig_point_serial_id, orig_point_record_id,
-                        gap_route_points, network_pg, network_pe):
+def filled_gap_edges(shortest_route, network_pg, weight='length'):
     """
-    Returns a list which contains the IDs of edges in the network that the 
-    route which fills the gap has passed through
+    Returns a list which contains the (u, v, key) IDs of edges in the network that the 
+    route which fills the gap has passed through, in the order they are passed through,
+    where the edge with the least weight is taken of parallel edges between two nodes
 
     Parameters:
-    orig_point_serial_id = The serial ID of the origin point of the gap
-    orig_point_record_id = The record ID of the origin point of the gap
-    filled_gap_route = The shortest route that was found to fill the gap detected
+    shortest_route = A list of the IDs of the nodes on the shortest route that fills the gap
     network_pg = A Directed Graph object that is projected 
     and contains the data of the transportation network
-    network_pn = A Geodataframe that contains the data of the nodes in the Directed Graph network_pg
-    network_pe = A Geodataframe that contains the data of the edges in the Directed Graph network_pg
+    weight = The edge attribute the shortest route was found by
     """
-    serial_id_list = []
-    record_id_list = []
-    for node in gap_route_points:
-        serial_id_list.append(orig_point_serial_id)
-        record_id_list.append(orig_point_record_id)
-
-    gap_points_df = pd.DataFrame({'SerialID': serial_id_list,
-                                  'RecordID': record_id_list,
-                                  'geometry': gap_route_points})
-    gap_points_gdf = gpd.GeoDataFrame(gap_points_df, geometry='geometry')
-    network_epsg = network_pe.crs.to_epsg()
-    gap_points_gdf = gap_points_gdf.set_crs(epsg=network_epsg)
-    gap_points_on_net = map_point_to_network(gap_points_gdf, network_pg, network_pe)
-
-    return list(gap_points_on_net['nearEdgeID'].value_counts().index)
+    route_edges = []
+    for u, v in zip(shortest_route[:-1], shortest_route[1:]):
+        # the key of the parallel edge the shortest route goes along, edges without the weight count as 1
+        key = min(network_pg[u][v].items(), key=lambda item: item[1].get(weight, 1))[0]
+        route_edges.append((u, v, key))
+    return route_edges
 
 
 def connect_points_and_filled_gaps(points, filled_gaps):
@@ -370,36 +482,33 @@ def connect_points_and_filled_gaps(points, filled_gaps):
     points = A Geodataframe that contains the data of GPS points of a trip trajectory
     filled_gaps = A Geodataframe that contains the data of filled detected gaps in a trip trajectory
     """
+    # The LineString of every filled gap keyed by the 'SerialID','OrigPointRecordID' combination
+    # of its start point, the first filled gap is kept for a combination that has several
+    gap_lines = {}
+    for serial_id, record_id, gap_line in zip(filled_gaps['SerialID'], filled_gaps['OrigPointRecordID'],
+                                              filled_gaps['geometry']):
+        gap_lines.setdefault((serial_id, record_id), gap_line)
+
+    points_x = points['geometry'].x.tolist()
+    points_y = points['geometry'].y.tolist()
     # Coordinates of the points on the route
     route_points = []
-    for i in range(len(points)):
-        # Check if the 'SerialID','RecordID' combination of the current row
-        # exists in the Geodataframe for filled gaps
-        if np.any(np.all(points.loc[i][['SerialID', 'RecordID']].values == filled_gaps[['SerialID', 'OrigPointRecordID']].values,
-                         axis=1)):
-            # Find the row of Geodataframe for filled gaps,
-            # and get the coordinates of the LineString on the row
-            gap_row = filled_gaps[(filled_gaps['SerialID'] == points.loc[i]['SerialID']) &
-                                  (filled_gaps['OrigPointRecordID'] == points.loc[i]['RecordID'])]
+    for serial_id, record_id, x, y in zip(points['SerialID'], points['RecordID'], points_x, points_y):
+        # Check if the 'SerialID','RecordID' combination of the current point starts a filled gap
+        gap_line = gap_lines.get((serial_id, record_id))
+        if gap_line is not None:
             # Add coordinates for the filled gap into route_points
-            for coord in list(gap_row['geometry'].values[0].coords):
+            for coord in gap_line.coords:
                 # Make sure there is no consecutive duplicate points in the line
-                # print(coord)
                 if (len(route_points) > 0 and coord == route_points[-1]):
-                    # print(route_points[-1])
                     continue
                 route_points.append(coord)
 
-        else:
-            # if the point of the current row does not overlap on the last point
-            # in route_points add its coordinates into route_points
-            if (len(route_points) > 0 and
-                    (points.loc[i]['geometry'].x, points.loc[i]['geometry'].y) != route_points[-1]):
-                route_points.append(
-                    (points.loc[i]['geometry'].x, points.loc[i]['geometry'].y))
-            # if the point of the current row overlaps with the last point, ignore it
-            else:
-                continue
+        # if the point of the current row does not overlap on the last point
+        # in route_points add its coordinates into route_points,
+        # if it overlaps with the last point, ignore it
+        elif (len(route_points) > 0 and (x, y) != route_points[-1]):
+            route_points.append((x, y))
 
     # Generate a single LineString for the route
     route_line = LineString(route_points)
@@ -4,7 +4,7 @@ Source Name: variable_generator.py
 Creator: Mengtong Shi (shim17@mcmaster.ca)
 Requirements: Python 3.8 or later
 Date Created: Feb 01, 2023
-Last Revised: Feb 15, 2023
+Last Revised: Oct 18, 2026
 Description: Implements methods that are used to generate route choice analysis variables from
              the given route choice
 
@@ -24,15 +24,24 @@ Version History:
 2023-02-14 (variable_generator.py) Updated var_gen to output number of left and right turns
 
 2023-02-15 (variable_generator.py) Updated var_gen
+
+2026-10-18 (variable_generator.py) Find the nearest streets of all points on a route at once
+    from the EdgeAttributes of the network, comparing streets by integer name codes
+
+2026-10-18 (variable_generator.py) Give every edge without a name its own name code in find_nearest_streets,
+    so longest_leg counts the legs of different streets without a name separately
 """
 
 import math
 import geopandas as gpd
 import pandas as pd
+import numpy as np
+import pygeos
 from shapely.geometry import Point
+from network_index import EdgeAttributes
 
 
-def var_gen(route, network_edges):
+def var_gen(route, network_edges, edge_attributes=None):
     """
     Returns a GeoDataframe that contains route choice analysis
     variables generated for the route choice
@@ -41,7 +50,10 @@ def var_gen(route, network_edges):
     route = A GeoDataframe that represents a route choice
     network_edges = A Geodataframe that contains the data of
                     the edges in the Directed Graph
+    edge_attributes = The EdgeAttributes of network_edges, built here if not given
     """
+    if edge_attributes is None:
+        edge_attributes = EdgeAttributes(network_edges)
     # Project the route to the same CRS as the network dataset
     network_epsg = network_edges.crs.to_epsg()
     route_gdf_proj = route.to_crs(epsg=network_epsg)
@@ -71,10 +83,13 @@ def var_gen(route, network_edges):
         edges_route_passed = list(route_gdf_proj.loc[i]['edgesRoutePassed'])
         # print("Length of matched Route Choice is: " +
         #       str(round(route_dist_length, 2)) + " meters")
+        # The nearest street of every point on the route
+        route_streets = find_nearest_streets(
+            edge_attributes, edges_route_passed, curr_route_coord)
 
         # Count the number of turns
         num_of_t = count_turns(
-            network_edges, edges_route_passed, curr_route_coord)
+            edge_attributes, route_streets, curr_route_coord)
         # print(num_of_turns)
 
         num_lt.append(num_of_t['left'])
@@ -82,7 +97,7 @@ def var_gen(route, network_edges):
 
         # Get information about the longest leg
         longest_leg_info = longest_leg(
-            network_edges, edges_route_passed, curr_route_coord)
+            edge_attributes, route_streets, curr_route_coord)
         # print(longest_leg_info)
         street_name.append(longest_leg_info['legStreet'])
         length.append(round(longest_leg_info['legLength']))
@@ -101,39 +116,46 @@ def var_gen(route, network_edges):
     return rca_gdf
 
 
-def find_nearest_street(network_pe, edges_route_passed, coord):
+def find_nearest_streets(edge_attributes, edges_route_passed, route_coord):
     """
-    Returns a string which is the name of the nearest street to a point
+    Returns a numpy array of the name codes of the nearest street to every point,
+    where the nearest street of a point is the first of the nearest edges passed by the route.
+    An edge without a name is a street of its own, with the negative code -1 - the position of the edge
 
     Parameters:
-    network_pe = A Geodataframe that contains the data of the edges in the Directed Graph
+    edge_attributes = The EdgeAttributes of the edges in the Directed Graph
     edges_route_passed = A list of the edges passed by the route
-    coord = A pair of coordinates for the point
+    route_coord = A list of coordinates for the points on the route
+    """
+    edges_pos = edge_attributes.get_positions(edges_route_passed)
+    route_points = pygeos.points(np.asarray(route_coord, dtype=float).reshape(-1, 2))
+    # The distance from every point to every edge passed by the route
+    dists = pygeos.distance(route_points[:, None], edge_attributes.geometry[edges_pos][None, :])
+    nearest_pos = edges_pos[np.argmin(dists, axis=1)]
+    name_codes = edge_attributes.name_codes[nearest_pos]
+    return np.where(name_codes >= 0, name_codes, -1 - nearest_pos)
+
+
+def different_streets(street1, street2):
+    """
+    Returns whether two name codes of streets are different streets,
+    which streets without a name always are
+
+    Parameters:
+    street1 = The name code of the first street
+    street2 = The name code of the second street
     """
-    point_on_route = Point(coord[0], coord[1])
-    nearest_dist = network_pe.loc[edges_route_passed[0]
-                                  ]['geometry'].distance(point_on_route)
-    nearest_street = network_pe.loc[edges_route_passed[0]]['name']
-    for edge_id in edges_route_passed[1:]:
-        edge_geo = network_pe.loc[edge_id]['geometry']
-        curr_dist = edge_geo.distance(point_on_route)
-        # print(network_pe.loc[edge_id]['name'])
-        # print(curr_dist)
-        if curr_dist < nearest_dist:
-            nearest_dist = curr_dist
-            nearest_street = network_pe.loc[edge_id]['name']
-
-    return nearest_street
-
-
-def count_turns(network_pe, edges_route_passed, route_coord):
+    return street1 != street2 or street1 < 0
+
+
+def count_turns(edge_attributes, route_streets, route_coord):
     """
     Returns a dictionary that contains the number of left turns,
     right turns and total turns of the input route
 
     Parameters:
-    network_pe = A Geodataframe that contains the data of the edges in the Directed Graph
-    edges_route_passed = A list of the edges passed by the route
+    edge_attributes = The EdgeAttributes of the edges in the Directed Graph
+    route_streets = A numpy array of the name codes of the nearest street to every point on the route
     route_coord = A list of coordinates for the points on the route
     """
     num_left_turn = 0
@@ -171,16 +193,12 @@ def count_turns(network_pe, edges_route_passed, route_coord):
         # Check if the two line segments of the angle are going from one street to another.
         if abs(180 - angle_deg) > 30:
             # print(angle_deg)
-            start_street = find_nearest_street(
-                network_pe, edges_route_passed, route_coord[j - 1])
-            # print(start_street)
-            end_street = find_nearest_street(
-                network_pe, edges_route_passed, route_coord[j + 1])
-            # print(end_street)
+            start_street = route_streets[j - 1]
+            end_street = route_streets[j + 1]
             # If the two line segments of the angle are going from one street to another
             # Meaning a Turn is found. Then use cross product
             # to determine the direction of the turn(Left/Right)
-            if start_street != end_street:
+            if different_streets(start_street, end_street):
                 point_diff1 = (route_coord[j + 1][0] - route_coord[j - 1]
                                [0], route_coord[j + 1][1] - route_coord[j - 1][1])
                 point_diff2 = (
@@ -197,29 +215,29 @@ def count_turns(network_pe, edges_route_passed, route_coord):
     return {'left': num_left_turn, 'right': num_right_turn, 'total': (num_left_turn + num_right_turn)}
 
 
-def longest_leg(network_pe, edges_route_passed, route_coord):
+def longest_leg(edge_attributes, route_streets, route_coord):
     """
     Returns a dictionary that contains information about the longest
     leg in the route
 
     Parameters:
-    network_pe = A Geodataframe that contains the data of the edges in the Directed Graph
-    edges_route_passed = A list of the edges passed by the route
+    edge_attributes = The EdgeAttributes of the edges in the Directed Graph
+    route_streets = A numpy array of the name codes of the nearest street to every point on the route
     route_coord = A list of coordinates for the points on the route
     """
+    route_streets = route_streets.tolist()
+    # The lengths of the legs of the route by the name code of their street
     leg_len_dict = {}
-    curr_street = find_nearest_street(
-        network_pe, edges_route_passed, route_coord[0])
+    curr_street = route_streets[0]
     # lastPoint = route_coord[0]
     leg_len_dict[curr_street] = 0
     for i in range(1, len(route_coord)):
         line_seg_len = Point(
             route_coord[i - 1]).distance(Point(route_coord[i]))
         leg_len_dict[curr_street] += line_seg_len
-        point_street = find_nearest_street(
-            network_pe, edges_route_passed, route_coord[i])
+        point_street = route_streets[i]
 
-        if curr_street != point_street:
+        if different_streets(curr_street, point_street):
             if point_street not in leg_len_dict:
                 leg_len_dict[point_street] = 0
             # else:
@@ -238,4 +256,7 @@ def longest_leg(network_pe, edges_route_passed, route_coord):
             long_leg_len = curr_leg_len
         street_count += 1
 
-    return {'legStreet': long_leg_street, 'legLength': long_leg_len, 'numOfStreets': street_count}
+    # The name of the street of the longest leg, NaN for a street without a name
+    long_leg_name = edge_attributes.names[long_leg_street] if long_leg_street >= 0 else np.nan
+
+    return {'legStreet': long_leg_name, 'legLength': long_leg_len, 'numOfStreets': street_count}
@@ -67,4 +67,59 @@ def test_extract_stop_segments(sample_gps, expected_file_path):
     df = pd.read_csv(filepath_or_buffer=expected_file_path)
     stop_df = pd.read_csv(filepath_or_buffer=expected_output_file_path+'stop_out.csv')
     assert stop_df.equals(df) == True
-   
\ No newline at end of file
+   
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path+'sample-gps-1.csv'), (sample_gps_file_path+'sample-gps-2.csv')]
+)
+def test_episode_ranges(sample_gps):
+    data = pd.read_csv(sample_gps)
+    gps_data = gpsp.GPSPreprocess(data=data)
+    processed_data = gps_data.get_data()
+    ModeData = md.ModeDetection(processed_data=processed_data)
+    episode_data = ModeData.get_episode_data()
+    ExtractedData = ex.Extractor(episode_data=episode_data, processed_data=processed_data)
+    episodes = ExtractedData.get_episode_ranges()
+    trips = ExtractedData.get_trip_ranges()
+    stops = ExtractedData.get_stop_ranges()
+    assert len(episodes) == len(episode_data.index)
+    assert (episodes['start'][1:] == episodes['end'][:-1]).all()
+    assert len(trips) + len(stops) == len(episodes)
+    assert (ExtractedData.get_activity_locations()['Modes'] == 'Stop').all()
+    assert len(ExtractedData.get_activity_locations().index) == (stops['end'] - stops['start']).sum()
+    filled = ExtractedData.get_episode_points(episodes)
+    assert filled.equals(ExtractedData.fill_points(episode_data, processed_data))
+
+
+# Builds GPS points of a drive with a fix every minute, three parked fixes 5 minutes apart and another drive,
+# where the consecutive time gaps make ModeDetection detect episodes out of order of RecordID.
+def make_gap_trace():
+    rows = []
+    time = pd.Timestamp('2009-09-03 11:00')
+    latitude = 43.3374
+    for record_id in range(1, 84):
+        parked = 41 <= record_id <= 43
+        time += pd.Timedelta(minutes=5 if parked else 1)
+        latitude += 0.00002 if parked else 0.005
+        rows.append([record_id, 26, time.strftime('%m/%d/%Y %H:%M'), latitude, -79.7903, '3D Fix', 0.5,
+                     0 if parked else 40, 50])
+    return pd.DataFrame(rows, columns=['RecordID', 'SerialID', 'LocalTime', 'latitude', 'longitude',
+                                       'Fix_Status', 'DOP', 'Speed_kmh', 'Limit_kmh'])
+
+
+@pytest.mark.parametrize('engine', ['array', 'loop'])
+def test_episode_ranges_gaps(engine):
+    processed_data = gpsp.GPSPreprocess(data=make_gap_trace()).get_data()
+    episode_data = md.ModeDetection(processed_data=processed_data, engine=engine).get_episode_data()
+    assert not episode_data['RecordID'].is_monotonic_increasing
+    ExtractedData = ex.Extractor(episode_data=episode_data, processed_data=processed_data)
+    episodes = ExtractedData.get_episode_ranges()
+    assert episodes['start'][0] == 0 and episodes['end'][-1] == len(processed_data.index)
+    assert (episodes['start'][1:] == episodes['end'][:-1]).all()
+    assert (episodes['end'] > episodes['start']).all()
+    assert ExtractedData.get_activity_locations()['RecordID'].tolist() == [40, 41, 42, 43]
+    trip = ExtractedData.get_trip_segments()
+    assert (trip['Modes'] == 'Drive').all()
+    assert len(trip.index) == len(processed_data.index) - 4
+    filled = ExtractedData.get_episode_points(episodes)
+    assert filled.equals(ExtractedData.fill_points(episode_data, processed_data))
+    assert filled['RecordID'].tolist() == processed_data['RecordID'].tolist()
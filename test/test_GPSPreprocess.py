@@ -3,8 +3,10 @@ import geopandas as gpd
 import pandas as pd
 import os
 import sys
+import warnings
 
 from src import GPSPreprocess as gpsp
+from src import gps_filters
 
 sample_gps_file_path = os.getcwd().split("PyERT-BLACK")[0] + 'PyERT-BLACK/quarto-example/data/sample-gps'
 
@@ -161,3 +163,237 @@ def test_smooth_data_outliers_only(sample_gps):
 
     assert data_length > smooth_data_length1
     assert smooth_data_length1 == 0
+
+
+# Tests if the function load_csv returns the same processed data as preprocessing the whole file at once, when
+# reading in chunks smaller than the file, so redundant points in different chunks have to be removed as well.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv'), (sample_gps_file_path + '/sample-gps-7.csv')]
+)
+@pytest.mark.parametrize(
+    'engine', ['c', 'pyarrow']
+)
+def test_load_csv(sample_gps, engine):
+    if engine == 'pyarrow':
+        pytest.importorskip('pyarrow.csv')
+    expected = gpsp.GPSPreprocess(data=pd.read_csv(sample_gps)).get_data()
+    processed_data = gpsp.GPSPreprocess(data=None).load_csv(sample_gps, chunksize=1000, engine=engine)
+
+    assert processed_data['LocalTime'].dtype == 'category'
+    assert processed_data['Timestamp'].dtype == 'datetime64[ns]'
+    pd.testing.assert_frame_equal(processed_data, expected, check_dtype=False, check_categorical=False)
+
+
+# Tests if the function load_csv returns the same processed data for any chunksize with filter stages comparing
+# each point with the points before and after it, including the points at the ends of the chunks.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+@pytest.mark.parametrize(
+    'chunksize', [7, 100]
+)
+def test_load_csv_neighbour_filters(sample_gps, chunksize):
+    filters = (gps_filters.SpeedJumpFilter(100.0), gps_filters.AccelerationCap(2.0))
+    expected = gpsp.GPSPreprocess(data=pd.read_csv(sample_gps), filters=filters).get_data()
+    processed_data = gpsp.GPSPreprocess(data=None, filters=filters).load_csv(sample_gps, chunksize=chunksize,
+                                                                            engine='c')
+
+    assert len(expected) < len(gpsp.GPSPreprocess(data=pd.read_csv(sample_gps)).get_data())
+    pd.testing.assert_frame_equal(processed_data, expected, check_dtype=False, check_categorical=False)
+
+
+# Tests if the function load_csv raises an exception for a file without the columns of the GPS data.
+def test_load_csv_missing_columns(tmp_path):
+    file_path = tmp_path / 'gps.csv'
+    pd.DataFrame({'RecordID': [1], 'latitude': [43.3], 'longitude': [-79.8]}).to_csv(file_path, index=False)
+    with pytest.raises(gpsp.InvalidDataException):
+        gpsp.GPSPreprocess(data=None).load_csv(file_path)
+
+
+# Tests if the function load_csv raises an exception for a file with values that cannot be read as the type of
+# their column, a missing SerialID and a latitude that is not a number.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-4.csv'), (sample_gps_file_path + '/sample-gps-5.csv')]
+)
+def test_load_csv_invalid_values(sample_gps):
+    with pytest.raises(gpsp.InvalidDataException):
+        gpsp.GPSPreprocess(data=None).load_csv(sample_gps)
+
+
+# Tests if the function concat_chunks combines the categories of slices of a DataFrame without changing the slices.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_concat_chunks(sample_gps):
+    data = pd.read_csv(sample_gps, dtype=gpsp.GPS_COLUMNS)
+    data['Fix_Status'] = data['Fix_Status'].cat.set_categories(['3D Fix'])
+    first = data.iloc[:10]
+    second = data.iloc[10:].assign(Fix_Status=pd.Categorical(['2D Fix'] * (len(data.index) - 10)))
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        combined = gpsp.GPSPreprocess(data=None).concat_chunks([first, second])
+    assert not [warning for warning in caught if warning.category.__name__ == 'SettingWithCopyWarning']
+    assert list(combined['Fix_Status'].cat.categories) == ['3D Fix', '2D Fix']
+    assert list(first['Fix_Status'].cat.categories) == ['3D Fix']
+    assert len(combined.index) == len(data.index)
+
+
+# Tests if the function load_gpx returns the same processed data from a GPX file as load_csv from the csv file
+# with the same points.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1'), (sample_gps_file_path + '/sample-gps-2')]
+)
+def test_load_gpx(sample_gps):
+    expected = gpsp.GPSPreprocess(data=None).load_csv(sample_gps + '.csv', engine='c')
+    processed_data = gpsp.GPSPreprocess(data=None).load_gpx(sample_gps + '.gpx', chunksize=1000)
+
+    pd.testing.assert_frame_equal(processed_data, expected, check_dtype=False, check_categorical=False)
+
+
+# Tests if the function load_gpx fills in the columns missing from the track points of a GPX file, deriving the
+# speed of each point from the previous point including across chunks.
+def test_load_gpx_track_points(tmp_path):
+    file_path = tmp_path / 'track.gpx'
+    points = ''.join('<trkpt lat="%.5f" lon="-79.79"><time>2020-01-01T00:00:%02dZ</time></trkpt>\n'
+                     % (43.3 + i * 1e-4, i * 2) for i in range(5))
+    file_path.write_text('<?xml version="1.0"?>\n<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+                         '<trk><trkseg>\n' + points + '</trkseg></trk></gpx>\n')
+    processed_data = gpsp.GPSPreprocess(data=None).load_gpx(file_path, chunksize=2, serial_id=7)
+
+    assert processed_data['RecordID'].tolist() == [0, 1, 2, 3, 4]
+    assert (processed_data['SerialID'] == 7).all()
+    assert processed_data['LocalTime'][0] == '01/01/2020 00:00'
+    assert processed_data['Speed_kmh'][0] == 0
+    # 1e-4 degrees of latitude is about 11.1 m, in 2 seconds
+    assert processed_data['Speed_kmh'][1:].tolist() == pytest.approx([20.04] * 4, abs=0.01)
+
+
+# Tests if the function load_csv writes the processed data to the cache and returns the same data from the cache on
+# the next load of the same file, and if a file with different content is not loaded from the cache.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-2.csv')]
+)
+def test_load_csv_cache(sample_gps, tmp_path):
+    pytest.importorskip('pyarrow.feather')
+    cache_dir = tmp_path / 'cache'
+    processed_data = gpsp.GPSPreprocess(data=None).load_csv(sample_gps, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    cached_data = gpsp.GPSPreprocess(data=None).load_csv(sample_gps, cache_dir=cache_dir)
+    assert isinstance(cached_data, gpd.GeoDataFrame)
+    pd.testing.assert_frame_equal(cached_data, processed_data)
+
+    file_path = tmp_path / 'gps.csv'
+    pd.read_csv(sample_gps, nrows=100).to_csv(file_path, index=False)
+    changed_data = gpsp.GPSPreprocess(data=None).load_csv(file_path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    assert len(changed_data) < len(processed_data)
+
+
+# Tests if the function load_csv caches the processed data of each list of filter stages separately, and returns the
+# same data from the cache as a fresh load with another chunksize.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_load_csv_cache_filters(sample_gps, tmp_path):
+    pytest.importorskip('pyarrow.feather')
+    cache_dir = tmp_path / 'cache'
+    filters = (gps_filters.SpeedJumpFilter(100.0), gps_filters.AccelerationCap(2.0))
+    processed_data = gpsp.GPSPreprocess(data=None, filters=filters).load_csv(sample_gps, chunksize=100,
+                                                                            cache_dir=cache_dir)
+    default_data = gpsp.GPSPreprocess(data=None).load_csv(sample_gps, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    assert len(processed_data) < len(default_data)
+
+    cached_data = gpsp.GPSPreprocess(data=None, filters=filters).load_csv(sample_gps, cache_dir=cache_dir)
+    fresh_data = gpsp.GPSPreprocess(data=None, filters=filters).load_csv(sample_gps)
+    assert len(os.listdir(cache_dir)) == 2
+    pd.testing.assert_frame_equal(cached_data, fresh_data, check_categorical=False)
+
+
+# Tests if the processed data with lazy_geometry has no 'geometry' column, and if add_geometry builds the same
+# GeoDataFrame as the processed data without lazy_geometry.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_lazy_geometry(sample_gps):
+    data = pd.read_csv(sample_gps)
+    expected = gpsp.GPSPreprocess(data=data).get_data()
+    processed_data = gpsp.GPSPreprocess(data=data, lazy_geometry=True).get_data()
+
+    assert 'geometry' not in processed_data
+    assert not isinstance(processed_data, gpd.GeoDataFrame)
+    longitude, latitude = gpsp.get_coordinates(processed_data)
+    assert (longitude == expected.geometry.x.to_numpy()).all()
+    assert (latitude == expected.geometry.y.to_numpy()).all()
+    pd.testing.assert_frame_equal(gpsp.add_geometry(processed_data)[expected.columns], expected)
+
+
+# Tests if the function filter_data with per_device sorts the points by device and only removes a point at the same
+# location as the previous point of the same device, keeping revisits and points of other devices at that location.
+def test_filter_data_per_device():
+    data = pd.DataFrame({'RecordID': [1, 2, 1, 3, 4, 5, 2],
+                         'SerialID': [1, 1, 2, 1, 1, 1, 2],
+                         'latitude': [43.1, 43.1, 43.1, 43.2, 43.1, 43.1, 43.1],
+                         'longitude': [-79.1, -79.1, -79.1, -79.2, -79.1, -79.1, -79.1],
+                         'Speed_kmh': [0.0] * 7})
+    filtered_data = gpsp.GPSPreprocess(data=None, per_device=True).filter_data(data)
+    assert filtered_data['SerialID'].tolist() == [1, 1, 1, 2]
+    assert filtered_data['RecordID'].tolist() == [1, 3, 4, 1]
+    assert 'geometry' in filtered_data
+
+    filtered_data = gpsp.GPSPreprocess(data=None).filter_data(data)
+    assert filtered_data['RecordID'].tolist() == [1, 3]
+
+
+# Tests if the function load_csv with per_device returns the same processed data in chunks as all at once.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_load_csv_per_device(sample_gps):
+    expected = gpsp.GPSPreprocess(data=pd.read_csv(sample_gps), per_device=True).get_data()
+    processed_data = gpsp.GPSPreprocess(data=None, per_device=True).load_csv(sample_gps, chunksize=1000, engine='c')
+
+    assert len(processed_data) > len(gpsp.GPSPreprocess(data=pd.read_csv(sample_gps)).get_data())
+    pd.testing.assert_frame_equal(processed_data, expected, check_dtype=False, check_categorical=False)
+
+
+# Tests if the function get_data returns the same processed data from the one pass of preprocess as from filter_data,
+# smooth_data and normalize_time in turn.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_preprocess(sample_gps):
+    data = pd.read_csv(sample_gps)
+    data.loc[::50, 'Speed_kmh'] = 200.0
+    gps_data = gpsp.GPSPreprocess(data=data)
+    expected = gps_data.normalize_time(gps_data.smooth_data(gps_data.filter_data(data)))
+
+    assert (gps_data.get_data()['Speed_kmh'] <= 180.0).all()
+    pd.testing.assert_frame_equal(gps_data.get_data(), expected)
+
+
+# Tests if the filter stages each remove the points they should from smooth_data: a point with a bad fix, a point
+# jumping away from and back to a track, and a point whose speed changes too quickly, where neither the first
+# point nor the points of another device are compared with the points before them.
+def test_smooth_data_filters():
+    data = pd.DataFrame({'RecordID': [1, 2, 3, 4, 5, 6, 7, 8],
+                         'SerialID': [1, 1, 1, 1, 1, 1, 2, 2],
+                         'LocalTime': ['10/11/2020 12:00'] * 6 + ['10/11/2020 12:01'] * 2,
+                         'latitude': [43.0, 43.0001, 43.1, 43.0002, 43.0003, 43.0004, 44.0, 44.0001],
+                         'longitude': [-79.0] * 6 + [-80.0] * 2,
+                         'Fix_Status': ['3D Fix', '3D Fix', '3D Fix', '3D Fix', '2D Fix', '3D Fix', '3D Fix', '3D Fix'],
+                         'DOP': [1.0, 1.0, 1.0, 1.0, 1.0, 8.0, None, 1.0],
+                         'Speed_kmh': [40.0, 40.0, 40.0, 40.0, 40.0, 40.0, 100.0, 40.0]})
+
+    def smooth(*filters):
+        return gpsp.GPSPreprocess(data=None, filters=filters).smooth_data(data)['RecordID'].tolist()
+
+    assert smooth() == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert smooth(gps_filters.FixQualityFilter(max_dop=5.0)) == [1, 2, 3, 4, 5, 7, 8]
+    assert smooth(gps_filters.FixQualityFilter(fix_statuses=['3D Fix'])) == [1, 2, 3, 4, 6, 7, 8]
+    assert smooth(gps_filters.SpeedJumpFilter(max_speed=180.0)) == [1, 2, 4, 5, 6, 7, 8]
+
+    data.loc[3, 'Speed_kmh'] = 120.0
+    assert smooth(gps_filters.AccelerationCap(max_acc=10.0)) == [1, 2, 3, 5, 6, 7, 8]
+    assert smooth(gps_filters.SpeedCap(100.0), gps_filters.SpeedJumpFilter()) == [1, 2, 5, 6, 7, 8]
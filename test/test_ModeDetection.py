@@ -6,6 +6,7 @@ from shapely.geometry import Point
 import sys
 
 
+from src import GPSPreprocess as gpsp
 from src import ModeDetection as md
 
 sample_gps_file_path = os.getcwd().split(
@@ -23,3 +24,108 @@ def test_distance():
     dist2 = ModeDetection.distance(p1, p1)
     assert round(dist1) == 157402
     assert dist2 == 0
+
+
+# Tests if calc_time_acc gives the cumulative seconds travelled within each minute of the data,
+# where the seconds restart at every new minute, and a non-negative acceleration for every point.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_calc_time_acc(sample_gps):
+    data = pd.read_csv(sample_gps)
+    processed_data = gpsp.GPSPreprocess(data=data).get_data()
+    ModeDetection = md.ModeDetection(processed_data=None)
+    [seconds, acc] = ModeDetection.calc_time_acc(processed_data)
+    minutes = list(processed_data['LocalTime'].str[-2:])
+
+    assert len(seconds) == len(processed_data)
+    assert len(acc) == len(processed_data)
+    for i in range(1, len(seconds)):
+        if minutes[i] == minutes[i - 1]:
+            assert seconds[i] >= seconds[i - 1]
+    for i in acc:
+        assert i >= 0
+
+
+# Tests if detecting episodes over runs of points gives the same episodes as detecting them point by point,
+# and if the episode table starts at the first point of every episode.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv'), (sample_gps_file_path + '/sample-gps-2.csv')]
+)
+def test_segment_episodes(sample_gps):
+    data = pd.read_csv(sample_gps)
+    processed_data = gpsp.GPSPreprocess(data=data).get_data()
+    loop_episodes = md.ModeDetection(processed_data=processed_data, engine='loop').get_episode_data()
+    array_episodes = md.ModeDetection(processed_data=processed_data, engine='array').get_episode_data()
+
+    ModeDetection = md.ModeDetection(processed_data=None)
+    episodes = ModeDetection.segment_episodes(processed_data['Speed_kmh'].to_numpy(dtype=float),
+                                              ModeDetection.get_point_times(processed_data),
+                                              processed_data['RecordID'].to_numpy())
+
+    assert array_episodes.equals(loop_episodes)
+    assert list(episodes['record']) == list(loop_episodes['RecordID'])
+    assert list(md.MODES[episodes['mode']]) == list(loop_episodes['Modes'])
+    for i in range(1, len(episodes)):
+        assert episodes['start'][i] > episodes['start'][i - 1]
+
+
+# Tests if an invalid engine is rejected
+def test_invalid_engine():
+    with pytest.raises(md.InvalidInputException):
+        md.ModeDetection(processed_data=None, engine='vectorized')
+
+
+# Tests if detecting episodes of each SerialID separately in parallel gives the episodes of every SerialID
+# in the order they appear in the data, as if each SerialID was detected on its own.
+@pytest.mark.parametrize(
+    'sample_gps_1, sample_gps_2', [((sample_gps_file_path + '/sample-gps-1.csv'),
+                                    (sample_gps_file_path + '/sample-gps-2.csv'))]
+)
+def test_detect_modes_by_serial(sample_gps_1, sample_gps_2):
+    data_1 = gpsp.GPSPreprocess(data=pd.read_csv(sample_gps_1)).get_data()
+    data_2 = gpsp.GPSPreprocess(data=pd.read_csv(sample_gps_2)).get_data()
+    data_2['SerialID'] = data_1['SerialID'][0] + 1
+    data = pd.concat([data_1, data_2], ignore_index=True)
+
+    episodes_1 = md.ModeDetection(processed_data=data_1).get_episode_data()
+    episodes_2 = md.ModeDetection(processed_data=data_2).get_episode_data()
+    episodes = md.ModeDetection(processed_data=data, by_serial=True, processes=2).get_episode_data()
+
+    assert episodes.equals(pd.concat([episodes_1, episodes_2], ignore_index=True))
+
+
+# Tests if detecting modes of the points given in chunks gives the same episodes as detecting modes
+# of all the points at once, while only keeping the points of the last minute between chunks.
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+@pytest.mark.parametrize(
+    'chunk_size', [1000, 37]
+)
+def test_incremental_mode_detection(sample_gps, chunk_size):
+    data = pd.read_csv(sample_gps)
+    processed_data = gpsp.GPSPreprocess(data=data).get_data()
+    expected = md.ModeDetection(processed_data=processed_data).get_episode_data()
+
+    detector = md.IncrementalModeDetection()
+    episodes = []
+    for i in range(0, len(processed_data), chunk_size):
+        episodes.append(detector.update(processed_data[i:i + chunk_size]))
+        assert len(detector.minute_points) <= 60
+    episodes.append(detector.close())
+    episodes = pd.concat([ep for ep in episodes if not ep.empty], ignore_index=True)
+
+    assert episodes.equals(expected)
+
+
+@pytest.mark.parametrize(
+    'sample_gps', [(sample_gps_file_path + '/sample-gps-1.csv')]
+)
+def test_detect_modes_lazy_geometry(sample_gps):
+    data = pd.read_csv(sample_gps)
+    expected = md.ModeDetection(gpsp.GPSPreprocess(data=data).get_data()).get_episode_data()
+    processed_data = gpsp.GPSPreprocess(data=data, lazy_geometry=True).get_data()
+    for engine in ['array', 'loop']:
+        episode_data = md.ModeDetection(processed_data, engine=engine).get_episode_data()
+        pd.testing.assert_frame_equal(episode_data, expected)
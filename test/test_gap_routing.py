@@ -0,0 +1,99 @@
+import pytest
+import networkx as nx
+from src import gap_routing as gr
+
+
+def make_graph():
+    network_g = nx.MultiDiGraph(crs='epsg:32617')
+    for node, (x, y) in enumerate([(0, 0), (100, 0), (100, 100), (0, 100), (500, 500)]):
+        network_g.add_node(node, x=x, y=y)
+    for u, v, length in [(0, 1, 100), (1, 2, 100), (2, 3, 100), (0, 3, 350), (3, 0, 100)]:
+        network_g.add_edge(u, v, length=length)
+    return network_g
+
+
+# Tests if the PathCache returns the same shortest paths from the cache as found by routing, counts its hits and
+# misses, caches searches without a path, and removes the least recently used paths first.
+def test_path_cache():
+    network_g = make_graph()
+    path_cache = gr.PathCache(max_size=2)
+
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 1, 2, 3]
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 1, 2, 3]
+    assert path_cache.shortest_path(network_g, 0, 4) is None
+    assert path_cache.shortest_path(network_g, 0, 4) is None
+    assert path_cache.get_stats() == {'hits': 2, 'misses': 2, 'size': 2}
+
+    assert path_cache.shortest_path(network_g, 3, 1) == [3, 0, 1]
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 1, 2, 3]
+    assert path_cache.get_stats() == {'hits': 2, 'misses': 4, 'size': 2}
+
+    # the same node pair of another graph is another path
+    network_g.remove_edge(1, 2)
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 3]
+
+
+# Tests if a graph whose edge lengths are changed in place gets another fingerprint, and so other cached paths,
+# once its 'weights_version' is changed.
+def test_path_cache_weights_version():
+    network_g = make_graph()
+    path_cache = gr.PathCache()
+    fingerprint = gr.graph_fingerprint(network_g)
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 1, 2, 3]
+
+    network_g.edges[0, 3, 0]['length'] = 150
+    network_g.graph['weights_version'] = 1
+    assert gr.graph_fingerprint(network_g) != fingerprint
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 3]
+
+    # a new version with the same edge lengths is the same graph
+    network_g.graph['weights_version'] = 2
+    assert path_cache.shortest_path(network_g, 0, 3) == [0, 3]
+    assert path_cache.get_stats() == {'hits': 1, 'misses': 2, 'size': 2}
+
+
+# Tests if a PathCache saved to a file is loaded again by a new PathCache with the same paths.
+def test_path_cache_file(tmp_path):
+    cache_path = str(tmp_path / 'paths.pkl')
+    path_cache = gr.PathCache(cache_path=cache_path)
+    path_cache.shortest_path(make_graph(), 0, 3)
+    path_cache.save()
+
+    path_cache = gr.PathCache(cache_path=cache_path)
+    assert len(path_cache) == 1
+    assert path_cache.shortest_path(make_graph(), 0, 3) == [0, 1, 2, 3]
+    assert path_cache.get_stats() == {'hits': 1, 'misses': 0, 'size': 1}
+
+
+# Tests if every routing engine finds the same shortest paths, and no path if there is none, where the edges are at
+# least as long as the straight line between their nodes as on a real network.
+@pytest.mark.parametrize('engine', gr.ROUTING_ENGINES)
+def test_gap_router(engine):
+    network_g = make_graph()
+    network_g.add_node(5, x=50, y=50)
+    network_g.add_edge(0, 5, length=80)
+    network_g.add_edge(5, 2, length=75)
+    router = gr.GapRouter(engine)
+
+    assert router(network_g, 0, 2) == [0, 5, 2]
+    assert router(network_g, 3, 1) == [3, 0, 1]
+    assert router(network_g, 2, 2) == [2]
+    assert router(network_g, 0, 4) is None
+    assert router(network_g, 4, 0) is None
+
+
+# Tests if the routing engines leave a gap without a path when the shortest path is longer than the budget, and find
+# it when the budget is large enough.
+@pytest.mark.parametrize('engine', gr.ROUTING_ENGINES)
+def test_gap_router_budget(engine):
+    network_g = make_graph()
+    # the straight line distance from node 0 to node 3 is 100, the shortest path is 300 long
+    assert gr.GapRouter(engine, budget_factor=2.5)(network_g, 0, 3) is None
+    assert gr.GapRouter(engine, budget_factor=2.5, min_budget=60)(network_g, 0, 3) == [0, 1, 2, 3]
+    assert gr.GapRouter(engine, budget_factor=3.5)(network_g, 0, 3) == [0, 1, 2, 3]
+
+    path_cache = gr.PathCache()
+    assert path_cache.shortest_path(network_g, 0, 3, route=gr.GapRouter(engine, budget_factor=2.5)) is None
+    assert path_cache.shortest_path(network_g, 0, 3, route=gr.GapRouter(engine)) == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        gr.GapRouter('flood')
@@ -0,0 +1,69 @@
+import pytest
+import numpy as np
+from shapely.geometry import Point
+
+from src import geodesic_utils as gu
+from src import ModeDetection as md
+
+
+# Tests if the batched distances are the same as the distances between each pair of points
+# given to the distance function of mode detection.
+def test_consecutive_distances():
+    lon = np.array([1.0, 2.0, 2.0, -79.79029, -79.790288])
+    lat = np.array([1.0, 2.0, 2.0, 43.33742, 43.33742])
+    ModeDetection = md.ModeDetection(processed_data=None)
+    dists = gu.consecutive_distances(lon, lat)
+
+    assert len(dists) == len(lon) - 1
+    assert round(dists[0]) == 157402
+    assert dists[1] == 0
+    for i in range(len(dists)):
+        assert dists[i] == pytest.approx(ModeDetection.distance(Point(lon[i], lat[i]),
+                                                                Point(lon[i + 1], lat[i + 1])))
+
+
+# Tests if the distances to a single point are within a meter of the float64 distances with float32.
+def test_distances_to_point_float32():
+    lon = -79.79 + np.linspace(0, 0.01, 50)
+    lat = 43.33 + np.linspace(0, 0.01, 50)
+    dists = gu.distances_to_point(lon, lat, lon[0], lat[0])
+    dists_32 = gu.distances_to_point(lon, lat, lon[0], lat[0], dtype=np.float32)
+
+    assert dists_32.dtype == np.float32
+    assert dists[0] == 0
+    assert np.all(np.abs(dists - dists_32) < 1)
+
+
+# Tests if exactly the pairs of points within the radius are found.
+def test_distances_within_radius():
+    rng = np.random.default_rng(0)
+    lon1 = -79.79 + rng.random(300) * 0.02
+    lat1 = 43.33 + rng.random(300) * 0.02
+    lon2 = -79.79 + rng.random(200) * 0.02
+    lat2 = 43.33 + rng.random(200) * 0.02
+    first, second, dists = gu.distances_within_radius(lon1, lat1, lon2, lat2, 150, block_size=64)
+
+    all_dists = gu.haversine(lon1[:, None], lat1[:, None], lon2[None, :], lat2[None, :])
+    expected = set(zip(*np.nonzero(all_dists <= 150)))
+
+    assert set(zip(first, second)) == expected
+    assert np.all(dists == all_dists[first, second])
+
+
+# Tests if points closer than the minimum distance to the last kept point are dropped,
+# and if the last kept point is reset at the start of each group.
+def test_thin_points():
+    # points 2 m apart along a parallel
+    lon = -79.79 + np.arange(10) * np.degrees(2 / gu.EARTH_RADIUS) / np.cos(np.radians(43.33))
+    lat = np.full(10, 43.33)
+    keep = gu.thin_points(lon, lat, 5)
+    assert keep.tolist() == [True, False, False, True, False, False, True, False, False, True]
+
+    keep = gu.thin_points(lon, lat, 3)
+    assert keep.tolist() == [True, False, True, False, True, False, True, False, True, False]
+
+    starts = np.zeros(10, dtype=bool)
+    starts[4] = True
+    keep = gu.thin_points(lon, lat, 5, starts)
+    assert keep.tolist() == [True, False, False, True, True, False, False, True, False, False]
+    assert gu.thin_points(lon[:0], lat[:0], 5).tolist() == []
@@ -0,0 +1,51 @@
+import pytest
+import math
+import geopandas as gpd
+import networkx as nx
+import osmnx as ox
+from shapely.geometry import Point
+from src import hmm_matching as hm
+
+test_data_path = './test_data'
+
+
+# Tests if the points along a two-way street are matched onto the edges in the direction they travel along,
+# which the nearest edges to the points do not tell apart.
+def test_hmm_matcher_direction():
+    network_g = nx.MultiDiGraph(crs='epsg:32617')
+    for node, (x, y) in enumerate([(0, 0), (100, 0), (200, 0), (100, 100)]):
+        network_g.add_node(node, x=x, y=y)
+    for u, v in [(0, 1), (1, 0), (1, 2), (2, 1), (1, 3), (3, 1)]:
+        network_g.add_edge(u, v, length=math.hypot(network_g.nodes[u]['x'] - network_g.nodes[v]['x'],
+                                                   network_g.nodes[u]['y'] - network_g.nodes[v]['y']))
+    network_n, network_e = ox.graph_to_gdfs(network_g)
+
+    for xs, expected in [(range(10, 200, 20), [(0, 1, 0)] * 5 + [(1, 2, 0)] * 5),
+                         (range(190, 0, -20), [(2, 1, 0)] * 5 + [(1, 0, 0)] * 5)]:
+        points = gpd.GeoDataFrame({'SerialID': ['1'] * len(xs), 'RecordID': [str(x) for x in xs],
+                                   'geometry': [Point(x, 2) for x in xs]}, crs='epsg:32617')
+        matched_points = hm.HMMMatcher()(points, network_g, network_e)
+        assert list(matched_points['nearEdgeID']) == expected
+        assert list(matched_points['geometry'].x) == list(xs)
+        assert list(matched_points['geometry'].y) == [0] * len(xs)
+
+
+# Tests if all the points of a trip segment are matched to the predetermined streets.
+@pytest.mark.parametrize(
+    'test_trip_seg_path, test_network_g_path',
+    [((test_data_path+'/test_rs_trip_seg/test_rs_trip_seg.shp'),
+     (test_data_path+'/test_rs_network_g.osm'))]
+)
+def test_hmm_matcher(test_trip_seg_path, test_network_g_path):
+    test_trip_seg = gpd.read_file(test_trip_seg_path)
+    network_g = ox.graph_from_xml(filepath=test_network_g_path,
+                                  bidirectional=False, simplify=False, retain_all=True)
+    network_g = ox.projection.project_graph(network_g)
+    network_n, network_e = ox.graph_to_gdfs(network_g)
+
+    matched_trip_seg = hm.HMMMatcher()(test_trip_seg, network_g, network_e)
+    streets = [(0, 1, 'Pearl Drive'), (1, 7, 'Sherwood Street'), (8, 36, 'Astral Drive'),
+               (37, 56, 'Brookfield Avenue'), (57, 82, 'Caldwell Road'), (83, 88, 'Atholea Drive'),
+               (89, len(matched_trip_seg), 'Pearl Drive')]
+    for start, end, street in streets:
+        assert list(matched_trip_seg['nearEdgeName'][start:end]) == [street] * (end - start)
@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+import geopandas as gpd
+import osmnx as ox
+import pandas as pd
+from shapely.geometry import LineString
+from src import network_index as ni
+
+test_data_path = './test_data'
+
+
+# Tests if the EdgeIndex finds nearest edges of the GPS points of a trip segment as near as the nearest edges found
+# by osmnx one point at a time.
+@pytest.mark.parametrize(
+    'test_trip_seg_path, test_network_g_path',
+    [((test_data_path+'/test_rs_trip_seg/test_rs_trip_seg.shp'),
+     (test_data_path+'/test_rs_network_g.osm'))]
+)
+def test_nearest_edges(test_trip_seg_path, test_network_g_path):
+    network_g = ox.graph_from_xml(filepath=test_network_g_path,
+                                  bidirectional=False, simplify=False, retain_all=True)
+    network_g = ox.projection.project_graph(network_g)
+    network_n, network_e = ox.graph_to_gdfs(network_g)
+    test_trip_seg = gpd.read_file(test_trip_seg_path).to_crs(network_e.crs)
+    x = test_trip_seg['geometry'].x.to_numpy()
+    y = test_trip_seg['geometry'].y.to_numpy()
+
+    edge_index = ni.EdgeIndex(network_e)
+    near_edges, dists = edge_index.nearest_edges(x, y, return_dist=True)
+    expected_edges, expected_dists = ox.distance.nearest_edges(network_g, x[:10], y[:10], return_dist=True)
+
+    assert len(near_edges) == len(test_trip_seg)
+    assert np.allclose(dists[:10], expected_dists)
+    for point, edge, dist in zip(test_trip_seg['geometry'], near_edges, dists):
+        assert network_e.loc[edge, 'geometry'].distance(point) == pytest.approx(dist)
+    assert edge_index.nearest_edges(x[:0], y[:0]) == []
+
+
+# Tests if snap_points projects every point onto the nearest leg of its own edge, which is not always its nearest
+# edge, and returns the distance along the edge to the snapped point.
+def test_snap_points():
+    network_e = gpd.GeoDataFrame(
+        {'geometry': [LineString([(0, 0), (10, 0), (10, 10), (20, 10)]), LineString([(0, 5), (5, 5)])]},
+        index=pd.MultiIndex.from_tuples([(1, 2, 0), (3, 4, 0)], names=['u', 'v', 'key']))
+    edge_index = ni.EdgeIndex(network_e)
+    x = np.array([4.0, 12.0, 25.0, 4.0, -3.0])
+    y = np.array([-2.0, 5.0, 12.0, 4.0, 0.0])
+
+    assert edge_index.nearest_edges(x, y) == [(1, 2, 0), (1, 2, 0), (1, 2, 0), (3, 4, 0), (1, 2, 0)]
+    edge_pos = edge_index.get_edge_positions([(1, 2, 0), (1, 2, 0), (1, 2, 0), (1, 2, 0), (1, 2, 0)])
+    snapped_x, snapped_y, seg_pos, offsets = edge_index.snap_points(x, y, edge_pos)
+    assert np.allclose(snapped_x, [4.0, 10.0, 20.0, 4.0, 0.0])
+    assert np.allclose(snapped_y, [0.0, 5.0, 10.0, 0.0, 0.0])
+    assert seg_pos.tolist() == [0, 1, 2, 0, 0]
+    assert np.allclose(offsets, [4.0, 15.0, 30.0, 4.0, 0.0])
+    # points far beyond the radius the nearest segments are first looked for within
+    near_edges, dists = edge_index.nearest_edges(np.array([2.0, 1000.0]), np.array([-500.0, 10.0]), return_dist=True)
+    assert near_edges == [(1, 2, 0), (1, 2, 0)]
+    assert np.allclose(dists, [500.0, 980.0])
+
+
+# Tests if EdgeAttributes looks up the names, one-way flags and lengths of edges by their positions, where edges
+# without a name are never on the same street and a list of names is one street.
+def test_edge_attributes():
+    network_e = gpd.GeoDataFrame(
+        {'name': ['Main Street', None, ['King Street', 'Queen Street'], 'Main Street'],
+         'oneway': [True, False, False, True],
+         'length': [10.0, 5.0, 12.0, 10.0],
+         'geometry': [LineString([(0, 0), (10, 0)]), LineString([(10, 0), (10, 5)]),
+                      LineString([(10, 5), (22, 5)]), LineString([(10, 0), (0, 0)])]},
+        index=pd.MultiIndex.from_tuples([(1, 2, 0), (2, 3, 0), (3, 4, 0), (2, 1, 0)], names=['u', 'v', 'key']))
+    edge_attributes = ni.EdgeAttributes(network_e)
+
+    edge_pos = edge_attributes.get_positions([(2, 1, 0), (1, 2, 0), (3, 4, 0), (2, 3, 0)])
+    assert edge_pos.tolist() == [3, 0, 2, 1]
+    names = edge_attributes.get_names(edge_pos)
+    assert names[:3] == ['Main Street', 'Main Street', ('King Street', 'Queen Street')]
+    assert pd.isna(names[3])
+    assert edge_attributes.same_name(0, 3)
+    assert not edge_attributes.same_name(0, 2)
+    assert not edge_attributes.same_name(1, 1)
+    assert edge_attributes.same_name(np.array([0, 1, 2]), np.array([3, 1, 2])).tolist() == [True, False, True]
+    assert edge_attributes.oneway.tolist() == [True, False, False, True]
+    assert edge_attributes.length.tolist() == [10.0, 5.0, 12.0, 10.0]
+    # the coordinates along the edges of a path, joined at the nodes
+    assert edge_attributes.get_path_coordinates([0, 1, 2]).tolist() == [[0, 0], [10, 0], [10, 5], [22, 5]]
+    assert edge_attributes.get_path_coordinates([3]).tolist() == [[10, 0], [0, 0]]
+
+
+# Tests if the EdgeIndex finds the k nearest edges within the radius of points, and the nearest edge of a point
+# without any edge within the radius.
+def test_candidate_edges():
+    network_e = gpd.GeoDataFrame(
+        {'geometry': [LineString([(0, 0), (10, 0)]), LineString([(10, 0), (10, 5)]),
+                      LineString([(10, 5), (22, 5)]), LineString([(10, 0), (0, 0)])]},
+        index=pd.MultiIndex.from_tuples([(1, 2, 0), (2, 3, 0), (3, 4, 0), (2, 1, 0)], names=['u', 'v', 'key']))
+    edge_index = ni.EdgeIndex(network_e)
+
+    point_pos, edge_pos, dists = edge_index.candidate_edges(np.array([5.0, 11.0, 30.0]), np.array([2.0, 4.0, 5.0]),
+                                                           k=3, radius=3)
+    assert point_pos.tolist() == [0, 0, 1, 1, 2]
+    assert edge_pos.tolist() == [0, 3, 1, 2, 2]
+    assert np.allclose(dists, [2, 2, 1, 1, 8])
+    point_pos, edge_pos, dists = edge_index.candidate_edges(np.array([11.0]), np.array([4.0]), k=1, radius=3)
+    assert edge_pos.tolist() == [1]
+
+
+# Tests if the NodeIndex finds the same nearest nodes of the GPS points of a trip segment as osmnx.
+@pytest.mark.parametrize(
+    'test_trip_seg_path, test_network_g_path',
+    [((test_data_path+'/test_rs_trip_seg/test_rs_trip_seg.shp'),
+     (test_data_path+'/test_rs_network_g.osm'))]
+)
+def test_nearest_nodes(test_trip_seg_path, test_network_g_path):
+    network_g = ox.graph_from_xml(filepath=test_network_g_path,
+                                  bidirectional=False, simplify=False, retain_all=True)
+    network_g = ox.projection.project_graph(network_g)
+    network_n, network_e = ox.graph_to_gdfs(network_g)
+    test_trip_seg = gpd.read_file(test_trip_seg_path).to_crs(network_e.crs)
+    x = test_trip_seg['geometry'].x.to_numpy()
+    y = test_trip_seg['geometry'].y.to_numpy()
+
+    node_index = ni.NodeIndex(network_n)
+    near_nodes, dists = node_index.nearest_nodes(x, y, return_dist=True)
+    expected_nodes, expected_dists = ox.distance.nearest_nodes(network_g, x, y, return_dist=True)
+
+    assert near_nodes == list(expected_nodes)
+    assert np.allclose(dists, expected_dists)
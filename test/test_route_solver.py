@@ -4,6 +4,7 @@ import pandas as pd
 import osmnx as ox
 import os
 import sys
+from shapely.geometry import Point, LineString
 from src import route_solver as rs
 
 #test_data_path = os.getcwd().split("PyERT-BLACK")[0] + 'PyERT-BLACK/test/test_data/sample-gps'
@@ -82,4 +83,43 @@ def test_detect_and_fill_gap(test_trip_seg_path, test_network_g_path):
     assert (('15325264' in orig_points_rec_id) or ('15325265' in orig_points_rec_id))
     assert (('15325284' in orig_points_rec_id) or ('15325289' in orig_points_rec_id))
     assert (('15325314' in orig_points_rec_id) or ('15325315' in orig_points_rec_id))
-    assert (('15325320' in orig_points_rec_id) or ('15325321' in orig_points_rec_id))
\ No newline at end of file
+    assert (('15325320' in orig_points_rec_id) or ('15325321' in orig_points_rec_id))
+    # Test if the edges of every filled gap are edges of the network that follow each other
+    for gap_edges in trip_seg_gaps['EdgesGapPassed']:
+        assert all(netowrk_g.has_edge(*edge) for edge in gap_edges)
+        assert all(edge[1] == next_edge[0] for edge, next_edge in zip(gap_edges[:-1], gap_edges[1:]))
+
+# Tests if the route connects the points and the filled gaps starting at them,
+# without consecutive duplicate coordinates
+def test_connect_points_and_filled_gaps():
+    points = gpd.GeoDataFrame({'SerialID': ['1', '1', '1', '2'],
+                               'RecordID': ['11', '12', '13', '11'],
+                               'geometry': [Point(1, 0), Point(3, 0), Point(3, 0), Point(9, 9)]})
+    filled_gaps = gpd.GeoDataFrame({'SerialID': ['1', '2'],
+                                    'OrigPointRecordID': ['11', '12'],
+                                    'EdgesGapPassed': [[], []],
+                                    'geometry': [LineString([(1, 0), (2, 1), (3, 0)]),
+                                                 LineString([(7, 7), (8, 8)])]})
+    route_line = rs.connect_points_and_filled_gaps(points, filled_gaps)
+    assert list(route_line.coords) == [(1, 0), (2, 1), (3, 0), (9, 9)]
+
+# Tests if routing the serial IDs of a trip in a pool of processes gives the same routes in the same order
+@pytest.mark.parametrize(
+    'test_trip_seg_path, test_network_g_path', 
+    [((test_data_path+'/test_rs_trip_seg/test_rs_trip_seg.shp'),
+     (test_data_path+'/test_rs_network_g.osm'))]
+)
+def test_route_choice_gen_processes(test_trip_seg_path, test_network_g_path):
+    test_trip_seg = gpd.read_file(test_trip_seg_path)
+    netowrk_g = ox.graph_from_xml(filepath=test_network_g_path, 
+                                    bidirectional=False, simplify=False, retain_all=True)
+    netowrk_g = ox.projection.project_graph(netowrk_g)
+    network_n, network_e = ox.graph_to_gdfs(netowrk_g)
+    # three serial IDs with different numbers of points
+    test_trip = pd.concat([test_trip_seg.iloc[k:].assign(SerialID=str(k)) for k in range(3)], ignore_index=True)
+
+    routes = rs.route_choice_gen(test_trip, netowrk_g, network_e, network_n)
+    parallel_routes = rs.route_choice_gen(test_trip, netowrk_g, network_e, network_n, processes=2)
+    assert list(parallel_routes['SerialID']) == list(routes['SerialID'])
+    assert list(parallel_routes['edgesRoutePassed']) == list(routes['edgesRoutePassed'])
+    assert all(parallel_routes['geometry'].geom_equals_exact(routes['geometry'], 0))
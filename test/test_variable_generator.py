@@ -1,8 +1,11 @@
 import pytest
+import pandas as pd
 import geopandas as gpd
 import osmnx as ox
+from shapely.geometry import LineString
 from src import variable_generator as vg
 from src import route_solver as rs
+from src import network_index as ni
 
 test_data_path = './test_data'
 
@@ -42,4 +45,25 @@ def test_var_gen(test_trip_seg_path, test_network_g_path):
 
     # Test if the length of the longest leg is within the range
     assert test_rca.iloc[0]['lengthLongestLeg'] > -5
-    assert test_rca.iloc[0]['lengthLongestLeg'] < 5
\ No newline at end of file
+    assert test_rca.iloc[0]['lengthLongestLeg'] < 5
+
+
+# Tests if the legs of different streets without a name are counted as different streets by longest_leg, where
+# both streets without a name together are longer than the street with a name but each of them is shorter.
+def test_longest_leg_unnamed_streets():
+    network_e = gpd.GeoDataFrame(
+        {'name': ['Main Street', None, None],
+         'geometry': [LineString([(0, 0), (50, 0)]), LineString([(50, 0), (50, 30)]),
+                      LineString([(50, 30), (100, 30)])]},
+        index=pd.MultiIndex.from_tuples([(1, 2, 0), (2, 3, 0), (3, 4, 0)], names=['u', 'v', 'key']))
+    edge_attributes = ni.EdgeAttributes(network_e)
+    route_coord = [(x, 0) for x in range(0, 60, 10)] + [(50, y) for y in range(10, 40, 10)] + \
+                  [(x, 30) for x in range(60, 110, 10)]
+    route_streets = vg.find_nearest_streets(edge_attributes, list(network_e.index), route_coord)
+    assert route_streets[0] >= 0
+    assert route_streets[6] != route_streets[-1]
+
+    longest_leg_info = vg.longest_leg(edge_attributes, route_streets, route_coord)
+    assert longest_leg_info['legStreet'] == 'Main Street'
+    assert longest_leg_info['legLength'] == 60
+    assert longest_leg_info['numOfStreets'] == 3